@@ -0,0 +1,272 @@
+"""Read-only JSON API over the same cache and snapshot store as the dashboard.
+
+    python api_server.py --port 8080
+
+    GET /cities/{name}          one city: snapshot, comfort score, AQI category
+    GET /cities?names=a,b,c     several cities, deduplicated and sorted by name
+                                (gzip when accepted)
+    GET /healthz
+    GET /metrics                Prometheus text format (URBANPULSE_METRICS=1)
+
+Every JSON response carries a strong ETag; a matching If-None-Match returns
+304 with no body. Rendered responses are memoised for a few seconds, in an
+LRU of URBANPULSE_API_RESPONSE_CACHE_SIZE entries, so hot cities are served
+without touching the fetch layer.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from urbanpulse.core import Snapshot, score_snapshots
+from utils import metrics, quota
+from utils.pipeline import fetch_city, fetch_cities
+
+log = logging.getLogger("urbanpulse.api")
+
+RESPONSE_TTL = float(os.getenv("URBANPULSE_API_RESPONSE_TTL", "5"))
+RESPONSE_CACHE_SIZE = int(os.getenv("URBANPULSE_API_RESPONSE_CACHE_SIZE", "1024"))
+MAX_BATCH = int(os.getenv("URBANPULSE_API_MAX_BATCH", "100"))
+GZIP_MIN_BYTES = 512
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 502: "Bad Gateway"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Rendered:
+    """A serialized JSON body with its ETag and lazily gzipped variant."""
+
+    __slots__ = ("body", "etag", "expires_at", "_gzipped")
+
+    def __init__(self, obj, ttl=RESPONSE_TTL):
+        self.body = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+        self._gzipped = None
+
+    @property
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=5)
+        return self._gzipped
+
+
+def _city_payload(result):
+    if not result.ok:
+        status = 404 if isinstance(result.error, LookupError) else 502
+        raise ApiError(status, f"{result.city}: {result.error}")
+    payload = score_snapshots([Snapshot.from_payload(result.city, result.weather, result.aqi)])[0]
+    payload["fetched_at"] = result.fetched_at
+    payload["stale"] = result.stale
+    return payload
+
+
+def _fetch_batch(names):
+    # Batches queue for the call budget like the ingester instead of being
+    # shed after the short interactive wait.
+    with quota.priority(quota.BACKGROUND):
+        return fetch_cities(names)
+
+
+class CityApi:
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._rendered = OrderedDict()
+
+    def _cached(self, key):
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            return None
+        if rendered.expires_at <= time.monotonic():
+            del self._rendered[key]
+            return None
+        self._rendered.move_to_end(key)
+        return rendered
+
+    def _store(self, key, rendered):
+        self._rendered[key] = rendered
+        self._rendered.move_to_end(key)
+        while len(self._rendered) > self.maxsize:
+            self._rendered.popitem(last=False)
+        return rendered
+
+    async def city(self, name):
+        key = ("city", name.strip().lower())
+        rendered = self._cached(key)
+        if rendered is None:
+            result = await asyncio.get_running_loop().run_in_executor(None, fetch_city, name)
+            rendered = self._store(key, Rendered(_city_payload(result)))
+        return rendered
+
+    async def cities(self, names):
+        # One entry per distinct city, in a canonical order, so requests
+        # naming the same set share a rendered response.
+        unique = {}
+        for name in names:
+            unique.setdefault(name.strip().lower(), name.strip())
+        names = [unique[key] for key in sorted(unique)]
+        key = ("cities",) + tuple(sorted(unique))
+        rendered = self._cached(key)
+        if rendered is None:
+            results = await asyncio.get_running_loop().run_in_executor(None, _fetch_batch, names)
+            items = []
+            for result in results:
+                try:
+                    items.append(_city_payload(result))
+                except ApiError as exc:
+                    items.append({"city": result.city, "error": str(exc), "status": exc.status})
+            rendered = self._store(key, Rendered({"cities": items}))
+        return rendered
+
+    async def route(self, path, query):
+        if path == "/healthz":
+            return Rendered({"status": "ok"}, ttl=0)
+        if path.startswith("/cities/") and len(path) > len("/cities/"):
+            return await self.city(unquote(path[len("/cities/"):]))
+        if path == "/cities":
+            names = [n.strip() for n in ",".join(query.get("names", [])).split(",") if n.strip()]
+            if not names:
+                raise ApiError(400, "names query parameter is required")
+            if len(names) > MAX_BATCH:
+                raise ApiError(400, f"at most {MAX_BATCH} names per request")
+            return await self.cities(names)
+        raise ApiError(404, "not found")
+
+
+_ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+
+
+def _etag_matches(if_none_match, etag):
+    """Weak comparison of `etag` against an If-None-Match list (or "*")."""
+    if if_none_match.strip() == "*":
+        return True
+    return etag in _ENTITY_TAG.findall(if_none_match)
+
+
+def _accepts_gzip(accept_encoding):
+    """Whether Accept-Encoding allows gzip, by name or "*", with a q-value above 0."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.lower()] = q
+    q = weights.get("gzip", weights.get("x-gzip", weights.get("*", 0.0)))
+    return q > 0
+
+
+def _response(status, headers, body=b""):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines += [f"{name}: {value}" for name, value in headers]
+    lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def handle_connection(api, reader, writer):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = request_line.split(" ", 2)
+            except ValueError:
+                writer.write(_response(400, [("Connection", "close")]))
+                break
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            writer.write(await _dispatch(api, method, target, headers, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def _dispatch(api, method, target, headers, keep_alive):
+    common = [("Connection", "keep-alive" if keep_alive else "close")]
+    if method not in ("GET", "HEAD"):
+        return _response(405, common + [("Allow", "GET, HEAD")])
+
+    url = urlsplit(target)
+    if url.path == "/metrics":
+        if not metrics.ENABLED:
+            return _response(404, common)
+        body = metrics.render_prometheus().encode()
+        response = _response(200, common + [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")], body)
+        return response[: len(response) - len(body)] if method == "HEAD" else response
+
+    try:
+        route = url.path.split("/")[1]
+        with metrics.span("urbanpulse_api_request_seconds", route=route if route in ("cities", "healthz") else "other"):
+            rendered = await api.route(url.path, parse_qs(url.query))
+    except ApiError as exc:
+        error = Rendered({"error": str(exc)}, ttl=0)
+        return _response(exc.status, common + [("Content-Type", "application/json")], error.body)
+    except Exception:
+        log.exception("unhandled error for %s", target)
+        return _response(502, common)
+
+    common += [("ETag", rendered.etag), ("Cache-Control", f"max-age={int(RESPONSE_TTL)}"), ("Vary", "Accept-Encoding")]
+    if _etag_matches(headers.get("if-none-match", ""), rendered.etag):
+        return _response(304, common)
+
+    body = rendered.body
+    if len(body) >= GZIP_MIN_BYTES and _accepts_gzip(headers.get("accept-encoding", "")):
+        body = rendered.gzipped
+        common.append(("Content-Encoding", "gzip"))
+    common.append(("Content-Type", "application/json; charset=utf-8"))
+    response = _response(200, common, body)
+    return response[: len(response) - len(body)] if method == "HEAD" else response
+
+
+async def serve(host, port):
+    api = CityApi()
+    server = await asyncio.start_server(lambda r, w: handle_connection(api, r, w), host, port, reuse_address=True)
+    log.info("UrbanPulse API listening on %s", ", ".join(str(sock.getsockname()) for sock in server.sockets))
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve UrbanPulse city data as read-only JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
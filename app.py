@@ -1,10 +1,35 @@
+from utils import profiling
+profiling.install()
+profiling.start_run()
+
+# pandas and plotly are imported inside the sections that need them so a
+# cold replica can paint the hero card before paying for them.
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import numpy as np
 from datetime import datetime, timedelta
-from utils.api import get_city_weather, get_city_aqi
+from utils.figcache import cached_figure
+from urbanpulse.core import (
+    RANKINGS,
+    Snapshot,
+    aqi_health_advice,
+    aqi_label_color,
+    calculate_comfort_score,
+    feels_like_temp,
+    get_comfort_emoji,
+    recommendations,
+    score_frame,
+    snapshot_frame,
+    triggered_rules,
+)
+from utils import alerts, comfort, metrics
+from utils.catalog import find_city, search_cities
+from utils.geo import CITIES
+from utils.history import query_history
+from utils.pipeline import fetch_cities, fetch_dashboard, refresh_in_background
+
+profiling.mark("imports")
+
+if metrics.ENABLED and metrics.METRICS_PORT:
+    metrics.start_http_server(metrics.METRICS_PORT)
 
 # -----------------------------
 # PAGE CONFIG
@@ -147,6 +172,8 @@ footer {
 </style>
 """, unsafe_allow_html=True)
 
+profiling.mark("page_setup")
+
 # -----------------------------
 # HELPER FUNCTIONS
 # -----------------------------
@@ -160,39 +187,190 @@ def metric_card(icon, label, value, subtitle=""):
     </div>
     """, unsafe_allow_html=True)
 
-def aqi_label_color(aqi):
-    if aqi <= 50:
-        return "Good", "#10b981", "😊"
-    elif aqi <= 100:
-        return "Moderate", "#facc15", "😐"
-    elif aqi <= 200:
-        return "Poor", "#fb923c", "😷"
-    else:
-        return "Very Poor", "#ef4444", "🚨"
-
-def calculate_comfort_score(temp, humidity, aqi):
-    """Calculate a comfort score (0-100) based on weather conditions"""
-    temp_score = max(0, 100 - abs(temp - 25) * 3)
-    humidity_score = max(0, 100 - abs(humidity - 50) * 1.5)
-    aqi_score = max(0, 100 - aqi * 0.8)
-    return round((temp_score + humidity_score + aqi_score) / 3, 1)
-
-def get_comfort_emoji(score):
-    if score >= 80: return "🌟"
-    elif score >= 60: return "👍"
-    elif score >= 40: return "😐"
-    else: return "😰"
-
-def feels_like_temp(temp, humidity, wind):
-    """Calculate feels-like temperature"""
-    heat_index = temp + (0.5555 * (6.11 * np.exp(5417.7530 * ((1/273.16) - (1/(273.15+temp)))) * (humidity/100) - 10))
-    wind_chill = 13.12 + 0.6215*temp - 11.37*(wind**0.16) + 0.3965*temp*(wind**0.16)
-    if temp > 27:
-        return round(heat_index, 1)
-    elif temp < 10:
-        return round(wind_chill, 1)
-    else:
-        return round(temp, 1)
+def age_text(seconds):
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{seconds // 60:.0f} min ago"
+    if seconds < 86400:
+        return f"{seconds // 3600:.0f} h ago"
+    return f"{seconds // 86400:.0f} d ago"
+
+POLLUTANT_NAMES = {"pm25": "PM2.5", "pm10": "PM10", "o3": "O₃", "no2": "NO₂", "co": "CO"}
+
+MAX_COMPARE = 5
+
+# -----------------------------
+# CHART BUILDERS
+# -----------------------------
+# Pure functions of their inputs so figures can be shared through
+# utils.figcache across reruns and sessions.
+def forecast_figure(dates, highs, lows):
+    import plotly.graph_objects as go
+    
+    fig = go.Figure()
+    
+    fig.add_trace(go.Scatter(
+        x=dates,
+        y=highs,
+        mode='lines+markers',
+        name='High',
+        line=dict(color='#ef4444', width=3),
+        marker=dict(size=10)
+    ))
+    
+    fig.add_trace(go.Scatter(
+        x=dates,
+        y=lows,
+        mode='lines+markers',
+        name='Low',
+        line=dict(color='#3b82f6', width=3),
+        marker=dict(size=10),
+        fill='tonexty',
+        fillcolor='rgba(139,92,246,0.1)'
+    ))
+    
+    fig.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white", size=14),
+        height=400,
+        hovermode='x unified',
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    return fig
+
+def hourly_figure(hours, temps_hourly):
+    import plotly.express as px
+    
+    fig = px.bar(
+        x=hours,
+        y=temps_hourly,
+        labels={'x': 'Hour', 'y': 'Temperature (°C)'},
+        color=temps_hourly,
+        color_continuous_scale='RdYlBu_r'
+    )
+    
+    fig.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white"),
+        showlegend=False,
+        height=300
+    )
+    return fig
+
+def radar_figure(factors, scores):
+    import plotly.graph_objects as go
+    
+    fig = go.Figure(data=go.Scatterpolar(
+        r=scores,
+        theta=factors,
+        fill='toself',
+        fillcolor='rgba(139,92,246,0.3)',
+        line=dict(color='#a78bfa', width=2)
+    ))
+    
+    fig.update_layout(
+        polar=dict(
+            bgcolor="rgba(0,0,0,0)",
+            radialaxis=dict(visible=True, range=[0, 100], gridcolor='rgba(255,255,255,0.1)')
+        ),
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white"),
+        height=300
+    )
+    return fig
+
+def pollutants_figure(values):
+    import plotly.graph_objects as go
+    
+    pollutants = ['PM2.5', 'CO', 'NO₂', 'O₃']
+    colors = ['#ef4444', '#f59e0b', '#8b5cf6', '#06b6d4']
+    
+    fig = go.Figure(data=[go.Bar(
+        x=pollutants,
+        y=values,
+        marker=dict(
+            color=colors,
+            line=dict(color='rgba(255,255,255,0.2)', width=2)
+        ),
+        text=[f'{v:.1f}' for v in values],
+        textposition='auto',
+    )])
+    
+    fig.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white", size=14),
+        height=350,
+        yaxis=dict(title="Concentration (μg/m³)"),
+        showlegend=False
+    )
+    return fig
+
+def aqi_trend_figure(hours_aqi, aqi_trend):
+    import plotly.express as px
+    
+    fig = px.area(
+        x=hours_aqi,
+        y=aqi_trend,
+        labels={'x': 'Hour', 'y': 'AQI (PM2.5)'}
+    )
+    
+    fig.add_hline(y=50, line_dash="dash", line_color="#10b981", annotation_text="Good")
+    fig.add_hline(y=100, line_dash="dash", line_color="#facc15", annotation_text="Moderate")
+    
+    fig.update_traces(fillcolor='rgba(139,92,246,0.3)', line=dict(color='#a78bfa', width=3))
+    
+    fig.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white"),
+        height=300
+    )
+    return fig
+
+COMPARE_COLORS = ['#a78bfa', '#ec4899', '#22d3ee', '#f59e0b', '#10b981', '#f87171']
+
+def comparison_figure(metric_names, cities, values):
+    import plotly.graph_objects as go
+    
+    fig = go.Figure(data=[
+        go.Bar(name=name, x=metric_names, y=city_values, marker_color=COMPARE_COLORS[i % len(COMPARE_COLORS)])
+        for i, (name, city_values) in enumerate(zip(cities, values))
+    ])
+    
+    fig.update_layout(
+        barmode='group',
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white", size=14),
+        height=400,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    return fig
+
+def best_time_figure(hours_comfort, comfort_by_hour):
+    import plotly.express as px
+    
+    fig = px.line(
+        x=hours_comfort,
+        y=comfort_by_hour,
+        labels={'x': 'Time', 'y': 'Comfort Score'}
+    )
+    
+    fig.add_hline(y=70, line_dash="dash", line_color="#10b981", annotation_text="Good")
+    
+    fig.update_traces(line=dict(color='#a78bfa', width=3), fill='tozeroy', fillcolor='rgba(139,92,246,0.2)')
+    
+    fig.update_layout(
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white"),
+        height=300
+    )
+    return fig
 
 # -----------------------------
 # APP HEADER
@@ -210,49 +388,102 @@ st.markdown("""
 
 st.markdown("<br>", unsafe_allow_html=True)
 
+profiling.mark("header")
+
 # -----------------------------
 # CITY SELECTION & COMPARISON
 # -----------------------------
+# Quick picks plus any city found through search this session. Typing in
+# the search box reruns only its fragment; picking a match reruns the page.
+if "recent_cities" not in st.session_state:
+    st.session_state["recent_cities"] = []
+
+
+def pick_city():
+    label = st.session_state.get("city_match")
+    if not label:
+        return
+    if label not in CITIES and label not in st.session_state["recent_cities"]:
+        st.session_state["recent_cities"].append(label)
+    st.session_state["primary_city"] = label
+    st.session_state["city_query"] = ""
+    st.session_state["city_picked"] = True
+
+
+@st.fragment
+def city_search():
+    if st.session_state.pop("city_picked", False):
+        st.rerun()
+    query = st.text_input(
+        "🔎 Search Any City", key="city_query", type="search", live="200ms", placeholder="Start typing a city…"
+    )
+    if not query or not query.strip():
+        return
+    matches = {match.label: match for match in search_cities(query, limit=8)}
+    if not matches:
+        st.caption("No matching cities")
+        return
+    st.selectbox(
+        "Matches",
+        list(matches),
+        index=None,
+        key="city_match",
+        placeholder=f"{len(matches)} matches — choose one",
+        format_func=lambda label: f"{label} · {matches[label].state}, {matches[label].country}",
+        on_change=pick_city,
+        label_visibility="collapsed",
+    )
+
+
 col1, col2 = st.columns([2, 1])
 
 with col1:
-    CITIES = ["Delhi", "Mumbai", "Bangalore", "Pune", "Hyderabad", "Bhopal", "Chennai", "Kolkata"]
-    city = st.selectbox("🎯 Select Primary City", CITIES, key="primary_city")
+    city = st.selectbox("🎯 Select Primary City", CITIES + st.session_state["recent_cities"], key="primary_city")
 
 with col2:
-    compare_city = st.selectbox("📊 Compare With", ["None"] + [c for c in CITIES if c != city], key="compare_city")
+    city_search()
+
+profiling.mark("city_selection")
 
 # -----------------------------
 # FETCH LIVE DATA
 # -----------------------------
+# Comparison cities are chosen inside their tab; on a full rerun they are
+# prefetched alongside the primary city so the tab renders from cache.
+compare_cities = [c for c in st.session_state.get("compare_cities", []) if c != city]
+
 with st.spinner("🔄 Fetching live city data..."):
-    weather = get_city_weather(city)
-    lat = weather["coord"]["lat"]
-    lon = weather["coord"]["lon"]
-    aqi_data = get_city_aqi(lat, lon)
-    
-    if compare_city != "None":
-        weather_compare = get_city_weather(compare_city)
-        lat_c = weather_compare["coord"]["lat"]
-        lon_c = weather_compare["coord"]["lon"]
-        aqi_data_compare = get_city_aqi(lat_c, lon_c)
+    data = fetch_dashboard(city, compare_cities)
+
+if not data.primary.ok:
+    st.error(f"⚠️ Could not load live data for {city}: {data.primary.error}")
+    st.stop()
+
+weather = data.primary.weather
+aqi_data = data.primary.aqi
+
+profiling.mark("fetch")
 
 # -----------------------------
 # EXTRACT METRICS
 # -----------------------------
-temp = weather["main"]["temp"]
-humidity = weather["main"]["humidity"]
-wind = weather["wind"]["speed"]
-pressure = weather["main"]["pressure"]
-visibility = weather.get("visibility", 10000) / 1000
-condition = weather["weather"][0]["description"].title()
-icon_code = weather["weather"][0]["icon"]
+snapshot = Snapshot.from_payload(city, weather, aqi_data)
 
-aqi = aqi_data["aqi"]
-pm25 = aqi_data["pm25"]
-co = aqi_data["co"]
-no2 = aqi_data["no2"]
-o3 = aqi_data["o3"]
+temp = snapshot.temp
+humidity = snapshot.humidity
+wind = snapshot.wind
+pressure = snapshot.pressure
+visibility = snapshot.visibility
+condition = snapshot.condition
+icon_code = snapshot.icon
+
+aqi = snapshot.aqi
+pm25 = snapshot.pm25
+co = snapshot.co
+no2 = snapshot.no2
+o3 = snapshot.o3
+overall_aqi = snapshot.overall_aqi
+dominant = snapshot.dominant
 
 
 aqi_text, aqi_color, aqi_emoji = aqi_label_color(aqi)
@@ -260,9 +491,15 @@ feels_like = feels_like_temp(temp, humidity, wind)
 comfort_score = calculate_comfort_score(temp, humidity, aqi)
 comfort_emoji = get_comfort_emoji(comfort_score)
 
-updated_time = datetime.now().strftime("%H:%M IST")
-sunrise = datetime.fromtimestamp(weather["sys"]["sunrise"]).strftime("%H:%M")
-sunset = datetime.fromtimestamp(weather["sys"]["sunset"]).strftime("%H:%M")
+# Data may come from a snapshot; show when it was fetched, not when we rendered.
+updated_time = datetime.fromtimestamp(data.primary.fetched_at or datetime.now().timestamp()).strftime("%H:%M IST")
+updated_time += f" ({age_text(data.primary.age)})"
+entry = find_city(city)
+place = f"{city}, {entry.country}" if entry is not None else city
+sunrise = datetime.fromtimestamp(snapshot.sunrise).strftime("%H:%M")
+sunset = datetime.fromtimestamp(snapshot.sunset).strftime("%H:%M")
+
+profiling.mark("compute")
 
 # -----------------------------
 # HERO CARD WITH ENHANCED INFO
@@ -278,7 +515,7 @@ st.markdown(f"""
 ">
     <div style="display:flex; justify-content:space-between; align-items:center; flex-wrap:wrap;">
         <div>
-            <h2 style="margin:0; font-size:32px;">📍 {city}, India</h2>
+            <h2 style="margin:0; font-size:32px;">📍 {place}</h2>
             <p style="font-size:80px; font-weight:900; margin:16px 0 8px 0; line-height:1;">
                 {temp:.1f}°C
             </p>
@@ -298,10 +535,17 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+profiling.mark("hero")
+
 # -----------------------------
 # AIR QUALITY ALERT
 # -----------------------------
-if aqi > 100:
+if data.primary.refresh_error is not None:
+    st.warning(f"📡 Live data is unavailable right now; showing the last reading from {age_text(data.primary.age)}.")
+
+firing = {rule.name for rule in triggered_rules(snapshot)}
+
+if "poor_air" in firing:
     st.markdown(f"""
     <div class="alert-banner">
         <strong>⚠️ Air Quality Alert</strong><br>
@@ -309,6 +553,25 @@ if aqi > 100:
     </div>
     """, unsafe_allow_html=True)
 
+# Alerts written by the ingester (or any session) for any city since this
+# session's last rerun; the first run only records where the feed is.
+seen = st.session_state.get("alerts_seen")
+if seen is None:
+    st.session_state["alerts_seen"] = alerts.latest_alert_id()
+else:
+    fresh = alerts.poll_alerts(seen, limit=1000)
+    for alert in fresh[-5:]:
+        st.toast(alerts.format_alert(alert), icon="🔔")
+    if fresh:
+        st.session_state["alerts_seen"] = fresh[-1].id
+
+active = alerts.active_alerts()
+if active:
+    with st.expander(f"🔔 Active alerts in {len(active)} {'city' if len(active) == 1 else 'cities'}"):
+        for name, rules in sorted(active.items()):
+            titles = " • ".join(alerts.RULES_BY_NAME[r].title for r in rules if r in alerts.RULES_BY_NAME)
+            st.markdown(f"**{name}**: {titles}")
+
 st.markdown("<br>", unsafe_allow_html=True)
 
 # -----------------------------
@@ -350,143 +613,71 @@ with c5:
 
 st.markdown("<br><br>", unsafe_allow_html=True)
 
+profiling.mark("metric_cards")
+
 # -----------------------------
-# TABS FOR DIFFERENT VIEWS
+# TAB SECTIONS
 # -----------------------------
-tab1, tab2, tab3, tab4 = st.tabs(["📈 Trends & Forecast", "🫁 Air Quality Deep Dive", "⚖️ City Comparison", "🎯 Recommendations"])
-
-with tab1:
-    st.markdown("### 7-Day Temperature Forecast")
-    
-    # Simulated forecast data
-    dates = [(datetime.now() + timedelta(days=i)).strftime("%a %d") for i in range(7)]
-    temps_high = [temp + np.random.randint(-3, 5) for _ in range(7)]
-    temps_low = [t - np.random.randint(3, 8) for t in temps_high]
-    
-    forecast_df = pd.DataFrame({
-        "Date": dates,
-        "High": temps_high,
-        "Low": temps_low
-    })
-    
-    fig_forecast = go.Figure()
-    
-    fig_forecast.add_trace(go.Scatter(
-        x=forecast_df["Date"],
-        y=forecast_df["High"],
-        mode='lines+markers',
-        name='High',
-        line=dict(color='#ef4444', width=3),
-        marker=dict(size=10)
-    ))
-    
-    fig_forecast.add_trace(go.Scatter(
-        x=forecast_df["Date"],
-        y=forecast_df["Low"],
-        mode='lines+markers',
-        name='Low',
-        line=dict(color='#3b82f6', width=3),
-        marker=dict(size=10),
-        fill='tonexty',
-        fillcolor='rgba(139,92,246,0.1)'
-    ))
-    
-    fig_forecast.update_layout(
-        plot_bgcolor="rgba(0,0,0,0)",
-        paper_bgcolor="rgba(0,0,0,0)",
-        font=dict(color="white", size=14),
-        height=400,
-        hovermode='x unified',
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-    )
-    
-    st.plotly_chart(fig_forecast, use_container_width=True)
+# Each tab is a fragment: widgets inside a tab rerun only that tab, and
+# only the open tab is computed (see render_tabs).
+@st.fragment
+@metrics.timed("urbanpulse_fragment_seconds", fragment="trends")
+def render_trends(city, forecast, forecast_error, temp, humidity, aqi, wind, visibility):
+    from utils.forecast import daily_summary
+    
+    st.markdown("### 5-Day Temperature Forecast")
+    
+    if forecast:
+        forecast_df = daily_summary(forecast)
+        forecast_df["Date"] = forecast_df.index.strftime("%a %d")
+        
+        fig_forecast = cached_figure(
+            "forecast", forecast_figure,
+            list(forecast_df["Date"]), forecast_df["high"].to_numpy(), forecast_df["low"].to_numpy()
+        )
+        
+        st.plotly_chart(fig_forecast, use_container_width=True)
+    else:
+        st.info(f"📭 Forecast unavailable for {city}: {forecast_error}")
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("### Hourly Temperature Pattern")
-        hours = [f"{i:02d}:00" for i in range(0, 24, 3)]
-        temps_hourly = [temp + np.sin(i/24 * 2 * np.pi) * 5 for i in range(0, 24, 3)]
-        
-        fig_hourly = px.bar(
-            x=hours,
-            y=temps_hourly,
-            labels={'x': 'Hour', 'y': 'Temperature (°C)'},
-            color=temps_hourly,
-            color_continuous_scale='RdYlBu_r'
-        )
+        since = datetime.now() - timedelta(hours=24)
+        temp_history = query_history(city, ["temp"], since.timestamp(), bucket=3 * 3600)
         
-        fig_hourly.update_layout(
-            plot_bgcolor="rgba(0,0,0,0)",
-            paper_bgcolor="rgba(0,0,0,0)",
-            font=dict(color="white"),
-            showlegend=False,
-            height=300
-        )
-        
-        st.plotly_chart(fig_hourly, use_container_width=True)
+        if temp_history:
+            hours = [datetime.fromtimestamp(ts).strftime("%H:00") for ts, _ in temp_history]
+            temps_hourly = [t for _, t in temp_history]
+            
+            fig_hourly = cached_figure("hourly", hourly_figure, hours, temps_hourly)
+            
+            st.plotly_chart(fig_hourly, use_container_width=True)
+        else:
+            st.info("📭 No temperature history recorded for this city yet")
     
     with col2:
         st.markdown("### Weather Comfort Index")
-        comfort_factors = ['Temperature', 'Humidity', 'Air Quality', 'Wind', 'Visibility']
-        comfort_scores = [
-            max(0, 100 - abs(temp - 25) * 3),
-            max(0, 100 - abs(humidity - 50) * 1.5),
-            max(0, 100 - aqi * 0.8),
-            min(100, wind * 20),
-            min(100, visibility * 10)
-        ]
+        factor_scores = comfort.comfort_factors(temp, humidity, aqi, wind, visibility)
         
-        fig_radar = go.Figure(data=go.Scatterpolar(
-            r=comfort_scores,
-            theta=comfort_factors,
-            fill='toself',
-            fillcolor='rgba(139,92,246,0.3)',
-            line=dict(color='#a78bfa', width=2)
-        ))
-        
-        fig_radar.update_layout(
-            polar=dict(
-                bgcolor="rgba(0,0,0,0)",
-                radialaxis=dict(visible=True, range=[0, 100], gridcolor='rgba(255,255,255,0.1)')
-            ),
-            paper_bgcolor="rgba(0,0,0,0)",
-            font=dict(color="white"),
-            height=300
+        fig_radar = cached_figure(
+            "radar", radar_figure, list(factor_scores), [float(v) for v in factor_scores.values()]
         )
         
         st.plotly_chart(fig_radar, use_container_width=True)
 
-with tab2:
+
+@st.fragment
+@metrics.timed("urbanpulse_fragment_seconds", fragment="air_quality")
+def render_air_quality(city, aqi, aqi_text, co, no2, o3, dominant, overall_aqi):
     st.markdown("### Air Quality Composition")
     
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        pollutants = ['PM2.5', 'CO', 'NO₂', 'O₃']
         values = [aqi, co/100, no2, o3]
-        colors = ['#ef4444', '#f59e0b', '#8b5cf6', '#06b6d4']
-        
-        fig_pollutants = go.Figure(data=[go.Bar(
-            x=pollutants,
-            y=values,
-            marker=dict(
-                color=colors,
-                line=dict(color='rgba(255,255,255,0.2)', width=2)
-            ),
-            text=[f'{v:.1f}' for v in values],
-            textposition='auto',
-        )])
-        
-        fig_pollutants.update_layout(
-            plot_bgcolor="rgba(0,0,0,0)",
-            paper_bgcolor="rgba(0,0,0,0)",
-            font=dict(color="white", size=14),
-            height=350,
-            yaxis=dict(title="Concentration (μg/m³)"),
-            showlegend=False
-        )
+        fig_pollutants = cached_figure("pollutants", pollutants_figure, values)
         
         st.plotly_chart(fig_pollutants, use_container_width=True)
     
@@ -496,145 +687,162 @@ with tab2:
         <div style="background:rgba(30,41,59,0.6); padding:20px; border-radius:16px; margin-top:30px;">
             <h4 style="margin-top:0;">Current Level: {aqi_text}</h4>
             <p style="color:#94a3b8; font-size:14px; line-height:1.6;">
-                {"✅ Safe for all outdoor activities" if aqi <= 50 else 
-                 "⚠️ Sensitive groups should limit prolonged outdoor exertion" if aqi <= 100 else
-                 "🚨 Everyone should reduce outdoor exertion" if aqi <= 200 else
-                 "❌ Avoid all outdoor activities"}
+                {aqi_health_advice(aqi)}
             </p>
             <br>
             <div style="font-size:12px; color:#64748b;">
                 <strong>PM2.5:</strong> {aqi:.1f} μg/m³<br>
                 <strong>CO:</strong> {co:.1f} μg/m³<br>
                 <strong>NO₂:</strong> {no2:.1f} μg/m³<br>
-                <strong>O₃:</strong> {o3:.1f} μg/m³
+                <strong>O₃:</strong> {o3:.1f} μg/m³<br>
+                {f"<strong>Dominant:</strong> {POLLUTANT_NAMES.get(dominant, dominant)} (AQI {overall_aqi})" if dominant else ""}
             </div>
         </div>
         """, unsafe_allow_html=True)
     
-    st.markdown("### AQI Trend (Simulated 24h)")
+    st.markdown("### AQI Trend (Last 24h)")
     
-    hours_aqi = list(range(24))
-    aqi_trend = [aqi + np.random.randint(-15, 20) for _ in hours_aqi]
+    since = datetime.now() - timedelta(hours=24)
+    aqi_history = query_history(city, ["aqi"], since.timestamp(), bucket=3600)
     
-    fig_aqi_trend = px.area(
-        x=hours_aqi,
-        y=aqi_trend,
-        labels={'x': 'Hour', 'y': 'PM2.5 (μg/m³)'}
+    if aqi_history:
+        hours_aqi = [datetime.fromtimestamp(ts) for ts, _ in aqi_history]
+        aqi_trend = [a for _, a in aqi_history]
+        
+        fig_aqi_trend = cached_figure("aqi_trend", aqi_trend_figure, hours_aqi, aqi_trend)
+        
+        st.plotly_chart(fig_aqi_trend, use_container_width=True)
+    else:
+        st.info("📭 No AQI history recorded for this city yet")
+
+
+@st.fragment
+@metrics.timed("urbanpulse_fragment_seconds", fragment="comparison")
+def render_comparison(city, snapshot):
+    # Kept under a plain session key so the choice survives while this tab is closed.
+    options = [c for c in CITIES + st.session_state.get("recent_cities", []) if c != city]
+    previous = [c for c in st.session_state.get("compare_cities", []) if c in options]
+    compare_cities = st.multiselect(
+        "📊 Compare With", options, default=previous, max_selections=MAX_COMPARE,
+        placeholder=f"Choose up to {MAX_COMPARE} cities",
     )
-    
-    fig_aqi_trend.add_hline(y=50, line_dash="dash", line_color="#10b981", annotation_text="Good")
-    fig_aqi_trend.add_hline(y=100, line_dash="dash", line_color="#facc15", annotation_text="Moderate")
-    
-    fig_aqi_trend.update_traces(fillcolor='rgba(139,92,246,0.3)', line=dict(color='#a78bfa', width=3))
-    
-    fig_aqi_trend.update_layout(
-        plot_bgcolor="rgba(0,0,0,0)",
-        paper_bgcolor="rgba(0,0,0,0)",
-        font=dict(color="white"),
-        height=300
+    st.session_state["compare_cities"] = compare_cities
+    
+    if not compare_cities:
+        st.info("👆 Select cities to compare from the dropdown above")
+        return
+    
+    snapshots = [snapshot]
+    for result in fetch_cities(compare_cities):
+        if result.ok:
+            snapshots.append(Snapshot.from_payload(result.city, result.weather, result.aqi))
+        else:
+            st.warning(f"⚠️ Could not load live data for {result.city}: {result.error}")
+    if len(snapshots) < 2:
+        return
+    
+    scored = score_frame(snapshot_frame(snapshots))
+    names = list(scored["city"])
+    
+    st.markdown(f"### {' vs '.join(names)}")
+
+    metric_columns = {
+        'Temperature (°C)': 'temp',
+        'Humidity (%)': 'humidity',
+        'Wind Speed (m/s)': 'wind',
+        'AQI (PM2.5)': 'aqi',
+        'Comfort Score': 'comfort',
+    }
+    values = scored[list(metric_columns.values())].to_numpy()
+
+    fig_comparison = cached_figure(
+        "comparison", comparison_figure, list(metric_columns), names, values
     )
-    
-    st.plotly_chart(fig_aqi_trend, use_container_width=True)
 
-with tab3:
-    if compare_city != "None":
-        st.markdown(f"### {city} vs {compare_city}")
-        
-        temp_c = weather_compare["main"]["temp"]
-        humidity_c = weather_compare["main"]["humidity"]
-        wind_c = weather_compare["wind"]["speed"]
-        aqi_c = aqi_data_compare["aqi"]
-        comfort_c = calculate_comfort_score(temp_c, humidity_c, aqi_c)
-        
-        comparison_data = {
-            'Metric': ['Temperature (°C)', 'Humidity (%)', 'Wind Speed (m/s)', 'AQI (PM2.5)', 'Comfort Score'],
-            city: [temp, humidity, wind, aqi, comfort_score],
-            compare_city: [temp_c, humidity_c, wind_c, aqi_c, comfort_c]
-        }
-        
-        df_comparison = pd.DataFrame(comparison_data)
-        
-        fig_comparison = go.Figure(data=[
-            go.Bar(name=city, x=df_comparison['Metric'], y=df_comparison[city], marker_color='#a78bfa'),
-            go.Bar(name=compare_city, x=df_comparison['Metric'], y=df_comparison[compare_city], marker_color='#ec4899')
-        ])
-        
-        fig_comparison.update_layout(
-            barmode='group',
-            plot_bgcolor="rgba(0,0,0,0)",
-            paper_bgcolor="rgba(0,0,0,0)",
-            font=dict(color="white", size=14),
-            height=400,
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-        )
-        
-        st.plotly_chart(fig_comparison, use_container_width=True)
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown(f"""
-            <div class="comparison-card">
-                <h3>🏙️ {city}</h3>
-                <div style="font-size:42px; font-weight:900; color:#a78bfa;">{comfort_score}</div>
-                <div style="color:#94a3b8;">Comfort Score</div>
-                <br>
-                <div style="font-size:14px; color:#cbd5e1;">
-                    🌡️ {temp:.1f}°C • 💧 {humidity}%<br>
-                    🌬️ {wind:.1f} m/s • {aqi_emoji} AQI {aqi:.1f}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
+    st.plotly_chart(fig_comparison, use_container_width=True)
+
+    for i, (col, row) in enumerate(zip(st.columns(len(scored)), scored.itertuples())):
+        with col:
             st.markdown(f"""
             <div class="comparison-card">
-                <h3>🏙️ {compare_city}</h3>
-                <div style="font-size:42px; font-weight:900; color:#ec4899;">{comfort_c}</div>
+                <h3>🏙️ {row.city}</h3>
+                <div style="font-size:42px; font-weight:900; color:{COMPARE_COLORS[i % len(COMPARE_COLORS)]};">{row.comfort}</div>
                 <div style="color:#94a3b8;">Comfort Score</div>
                 <br>
                 <div style="font-size:14px; color:#cbd5e1;">
-                    🌡️ {temp_c:.1f}°C • 💧 {humidity_c}%<br>
-                    🌬️ {wind_c:.1f} m/s • {aqi_label_color(aqi_c)[2]} AQI {aqi_c:.1f}
+                    🌡️ {row.temp:.1f}°C • 💧 {row.humidity}%<br>
+                    🌬️ {row.wind:.1f} m/s • {aqi_label_color(row.aqi)[2]} AQI {row.aqi:.1f}
                 </div>
             </div>
             """, unsafe_allow_html=True)
-        
-        winner = city if comfort_score > comfort_c else compare_city
-        st.markdown(f"""
-        <div style="text-align:center; margin-top:30px; font-size:24px; color:#a78bfa;">
-            🏆 <strong>{winner}</strong> has better weather conditions today!
-        </div>
-        """, unsafe_allow_html=True)
-    else:
-        st.info("👆 Select a city to compare from the dropdown above")
 
-with tab4:
-    st.markdown("### Personalized Recommendations")
-    
-    recommendations = []
-    
-    if temp > 35:
-        recommendations.append(("🌡️ High Temperature Alert", "Stay hydrated and avoid direct sun exposure between 11 AM - 4 PM", "#ef4444"))
-    elif temp < 15:
-        recommendations.append(("🧥 Cold Weather", "Wear warm clothing and stay protected from wind chill", "#3b82f6"))
-    
-    if aqi > 100:
-        recommendations.append(("😷 Poor Air Quality", "Wear an N95 mask outdoors and use air purifiers indoors", "#fb923c"))
-    
-    if humidity > 70:
-        recommendations.append(("💧 High Humidity", "Use dehumidifiers indoors and stay in air-conditioned spaces", "#06b6d4"))
+    winner = names[int(scored["comfort"].to_numpy().argmax())]
+    st.markdown(f"""
+    <div style="text-align:center; margin-top:30px; font-size:24px; color:#a78bfa;">
+        🏆 <strong>{winner}</strong> has the best weather conditions today!
+    </div>
+    """, unsafe_allow_html=True)
+
+
+@st.fragment
+@metrics.timed("urbanpulse_fragment_seconds", fragment="leaderboard")
+def render_leaderboard(city):
+    from utils.leaderboard import leaderboard
     
-    if wind > 10:
-        recommendations.append(("🌪️ Windy Conditions", "Secure loose objects and avoid high-rise areas", "#8b5cf6"))
+    st.markdown("### City Leaderboard")
     
-    if comfort_score > 80:
-        recommendations.append(("✨ Perfect Weather", "Great day for outdoor activities and exercise!", "#10b981"))
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        ranking = st.selectbox("🏅 Rank by", list(RANKINGS), key="leaderboard_rank")
+    with col2:
+        reverse = st.toggle("Worst first", key="leaderboard_reverse")
+    
+    column, ascending = RANKINGS[ranking]
+    ranked = leaderboard(column, ascending != reverse)
+    
+    # Every city with a published snapshot is ranked. The dashboard's own
+    # cities still missing (normally published by the ingester) are fetched
+    # in the background and join the table on a later render.
+    missing = [c for c in CITIES if c not in set(ranked["city"])]
+    if missing:
+        refresh_in_background(missing)
+        st.caption(f"🔄 Fetching {len(missing)} more {'city' if len(missing) == 1 else 'cities'} in the background")
+    if ranked.empty:
+        st.info("📭 No city snapshots published yet")
+        return
+    
+    position = ranked.index[ranked["city"] == city]
+    if len(position):
+        st.caption(f"📍 {city} ranks #{position[0] + 1} of {len(ranked)} cities by {ranking}")
+    
+    st.dataframe(
+        ranked[["rank", "city", "comfort", "aqi", "aqi_category", "temp", "feels_like", "humidity", "wind", "condition"]],
+        hide_index=True,
+        width="stretch",
+        column_config={
+            "rank": st.column_config.NumberColumn("#", width="small"),
+            "city": "City",
+            "comfort": st.column_config.ProgressColumn("Comfort", min_value=0, max_value=100, format="%.1f"),
+            "aqi": st.column_config.NumberColumn("AQI (PM2.5)", format="%.1f"),
+            "aqi_category": "Air Quality",
+            "temp": st.column_config.NumberColumn("Temp (°C)", format="%.1f"),
+            "feels_like": st.column_config.NumberColumn("Feels Like (°C)", format="%.1f"),
+            "humidity": st.column_config.NumberColumn("Humidity (%)", format="%d"),
+            "wind": st.column_config.NumberColumn("Wind (m/s)", format="%.1f"),
+            "condition": "Conditions",
+        },
+    )
+
+
+@st.fragment
+@metrics.timed("urbanpulse_fragment_seconds", fragment="recommendations")
+def render_recommendations(city, snapshot, forecast, forecast_error, aqi, comfort_score):
+    import pandas as pd
+    from utils.windows import best_windows, hourly_comfort
     
-    if not recommendations:
-        recommendations.append(("👍 Normal Conditions", "Weather conditions are moderate. Enjoy your day!", "#10b981"))
+    st.markdown("### Personalized Recommendations")
     
-    for title, desc, color in recommendations:
+    for title, desc, color in recommendations(snapshot, comfort_score):
         st.markdown(f"""
         <div style="
             background:rgba(30,41,59,0.6);
@@ -648,33 +856,92 @@ with tab4:
         </div>
         """, unsafe_allow_html=True)
     
-    st.markdown("### Best Time to Go Outside Today")
-    
-    hours_comfort = list(range(24))
-    comfort_by_hour = [comfort_score + np.sin((h-12)/24 * 2 * np.pi) * 15 for h in hours_comfort]
+    st.markdown("### Best Time to Go Outside")
     
-    fig_best_time = px.line(
-        x=hours_comfort,
-        y=comfort_by_hour,
-        labels={'x': 'Hour of Day', 'y': 'Comfort Score'}
+    if forecast:
+        window_hours = st.slider("⏱️ Time outside (hours)", 1, 6, 2, key="window_hours")
+        comfort_days, comfort_by_hour = hourly_comfort(forecast, aqi)
+        window_starts, window_scores = best_windows(comfort_by_hour, window=window_hours, k=2)
+        
+        hours_comfort = pd.date_range(comfort_days[0], periods=comfort_by_hour.size, freq="h")
+        
+        fig_best_time = cached_figure("best_time", best_time_figure, hours_comfort, comfort_by_hour.ravel())
+        
+        st.plotly_chart(fig_best_time, use_container_width=True)
+        
+        window_rows = []
+        for day, starts, scores in zip(comfort_days, window_starts, window_scores):
+            slots = [
+                f"{start:02d}:00 - {(start + window_hours) % 24:02d}:00 ({score:.0f})"
+                for start, score in zip(starts, scores) if start >= 0
+            ]
+            if slots:
+                window_rows.append(f"<strong>{day.strftime('%a %d')}</strong>: {' • '.join(slots)}")
+        
+        st.markdown(f"""
+        <div style="text-align:center; font-size:20px; color:#a78bfa; margin-top:20px; line-height:1.8;">
+            ⏰ Best times to go outside<br>
+            <span style="font-size:16px; color:#cbd5e1;">{"<br>".join(window_rows)}</span>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.info(f"📭 Hourly forecast unavailable for {city}: {forecast_error}")
+
+
+@st.fragment
+@metrics.timed("urbanpulse_fragment_seconds", fragment="tabs")
+def render_tabs():
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(
+        ["📈 Trends & Forecast", "🫁 Air Quality Deep Dive", "⚖️ City Comparison", "🎯 Recommendations", "🏆 Leaderboard"],
+        key="active_tab",
+        on_change="rerun",
     )
     
-    fig_best_time.add_hline(y=70, line_dash="dash", line_color="#10b981", annotation_text="Good")
+    with tab1:
+        if tab1.open:
+            render_trends(city, data.primary.forecast, data.primary.forecast_error, temp, humidity, aqi, wind, visibility)
     
-    fig_best_time.update_traces(line=dict(color='#a78bfa', width=3), fill='tozeroy', fillcolor='rgba(139,92,246,0.2)')
+    with tab2:
+        if tab2.open:
+            render_air_quality(city, aqi, aqi_text, co, no2, o3, dominant, overall_aqi)
     
-    fig_best_time.update_layout(
-        plot_bgcolor="rgba(0,0,0,0)",
-        paper_bgcolor="rgba(0,0,0,0)",
-        font=dict(color="white"),
-        height=300
-    )
+    with tab3:
+        if tab3.open:
+            render_comparison(city, snapshot)
     
-    st.plotly_chart(fig_best_time, use_container_width=True)
+    with tab4:
+        if tab4.open:
+            render_recommendations(city, snapshot, data.primary.forecast, data.primary.forecast_error, aqi, comfort_score)
     
-    best_hour = hours_comfort[comfort_by_hour.index(max(comfort_by_hour))]
-    st.markdown(f"""
-    <div style="text-align:center; font-size:20px; color:#a78bfa; margin-top:20px;">
-        ⏰ Best time to go outside: <strong>{best_hour:02d}:00 - {(best_hour+2)%24:02d}:00</strong>
-    </div>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+    with tab5:
+        if tab5.open:
+            render_leaderboard(city)
+
+# -----------------------------
+# TABS FOR DIFFERENT VIEWS
+# -----------------------------
+render_tabs()
+profiling.mark("tabs")
+
+if profiling.ENABLED:
+    startup = profiling.report(first_paint_section="hero")
+    with st.expander("⏱️ Startup profile"):
+        imports, sections, first_paint = startup
+        st.markdown(f"**Time to first paint:** {first_paint * 1000:.0f} ms")
+        st.table({"Section": [n for n, _ in sections], "ms": [round(t * 1000, 1) for _, t in sections]})
+        st.table({"Import": [n for n, _ in imports], "ms": [round(t * 1000, 1) for _, t in imports]})
+
+profiling.finish_run()
+
+if metrics.ENABLED and metrics.DEBUG_PANEL:
+    with st.expander("🛠️ Debug: latency"):
+        rows = metrics.summary()
+        st.table({
+            "Metric": [r[0] for r in rows],
+            "Labels": [r[1] for r in rows],
+            "Count": [r[2] for r in rows],
+            "Mean ms": [round(r[3], 1) for r in rows],
+            "p50 ms ≤": [r[4] for r in rows],
+            "p95 ms ≤": [r[5] for r in rows],
+            "Max ms": [round(r[6], 1) for r in rows],
+        })
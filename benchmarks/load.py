@@ -0,0 +1,276 @@
+"""Multi-session load generator for the dashboard.
+
+Drives N simulated viewers through app.py with Streamlit's AppTest harness,
+all inside one process so they share the response and figure caches exactly
+as sessions on one replica do. Upstream calls go to the local OpenWeather
+stand-in. Each session loops until --duration elapses: it waits an
+exponentially distributed think time (mean 1/--rate seconds), then picks an
+action from --mix:
+
+    select   switch the primary city (full rerun)
+    compare  open the comparison tab with two new compare cities (full rerun)
+    idle     do nothing this turn
+
+    python -m benchmarks.load --sessions 1 5 10 20 --duration 30
+    python -m benchmarks.load --sessions 10 --rate 2 --mix select=1,compare=1 --output load.json
+
+Every value of --sessions is run as its own step, so a sweep shows where
+rerun latency starts to degrade. Per step the report holds throughput,
+p50/p95/p99 rerun latency (overall and per action), upstream call counts
+and resident memory per session.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMPARE_TAB = "⚖️ City Comparison"
+DEFAULT_MIX = "select=0.4,compare=0.3,idle=0.3"
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("select", "compare", "idle"):
+            raise argparse.ArgumentTypeError(f"unknown action {name!r}")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("mix needs at least one positive weight")
+    return mix
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def rss_bytes():
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def latency_summary(samples):
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.50), 2),
+        "p95_ms": round(percentile(samples, 0.95), 2),
+        "p99_ms": round(percentile(samples, 0.99), 2),
+        "max_ms": round(samples[-1], 2) if samples else 0.0,
+    }
+
+
+# -------------------------------
+# SIMULATED SESSION
+# -------------------------------
+class Session:
+    def __init__(self, app_path, cities, rng, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(app_path, default_timeout=timeout)
+        self.cities = cities
+        self.rng = rng
+        self.samples = []
+        self.errors = 0
+
+    def rerun(self, action):
+        started = time.perf_counter()
+        try:
+            self.at.run()
+            failed = bool(self.at.exception)
+        except Exception:
+            failed = True
+        self.samples.append((action, (time.perf_counter() - started) * 1000))
+        if failed:
+            self.errors += 1
+
+    def act(self, action):
+        if action == "select":
+            self.at.session_state["primary_city"] = self.rng.choice(self.cities)
+            self.rerun(action)
+        elif action == "compare":
+            self.at.session_state["active_tab"] = COMPARE_TAB
+            self.at.session_state["compare_cities"] = self.rng.sample(self.cities, 2)
+            self.rerun(action)
+
+    def run(self, deadline, rate, actions, weights):
+        while True:
+            think = self.rng.expovariate(rate) if rate > 0 else 0.0
+            if time.monotonic() + think >= deadline:
+                return
+            time.sleep(think)
+            self.act(self.rng.choices(actions, weights)[0])
+
+
+def _share_apptest_runtime():
+    """Let AppTest sessions run concurrently in one process.
+
+    AppTest is built for one test at a time: each run installs a mock
+    Runtime as the global instance and clears it when done, so a session
+    still running would lose it mid-script. Keep the most recent mock
+    visible instead. Each run also recompiles app.py, and ast.parse is not
+    safe to call from several threads at once on some CPython 3.11 releases
+    ("AST constructor recursion depth mismatch"), so compiles take a lock.
+    A real server creates one Runtime and compiles once, so neither affects
+    what is being measured.
+    """
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    last = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+            return cls._instance
+        if last:
+            return last[0]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(last))
+
+    get_bytecode = ScriptCache.get_bytecode
+    lock = threading.Lock()
+
+    def locked(self, script_path):
+        with lock:
+            return get_bytecode(self, script_path)
+
+    ScriptCache.get_bytecode = locked
+
+
+def run_step(app_path, cities, server, n_sessions, duration, rate, mix, seed, timeout):
+    from utils import api
+    from utils.figcache import _cache as figure_cache
+    from utils.snapshots import snapshot_dir
+
+    api.clear_cache()
+    figure_cache.clear()
+    shutil.rmtree(snapshot_dir(), ignore_errors=True)
+    server.counts.clear()
+
+    # Every session opens the page once before the clock starts, as viewers
+    # arriving at a replica would; memory is measured after that first paint.
+    rss_before = rss_bytes()
+    sessions = [Session(app_path, cities, random.Random(seed + i), timeout) for i in range(n_sessions)]
+    for session in sessions:
+        session.rerun("open")
+    rss_after_open = rss_bytes()
+    opening_calls = sum(server.counts.values())
+
+    actions, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + duration
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=session.run, args=(deadline, rate, actions, weights), daemon=True)
+        for session in sessions
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    timed = [(action, ms) for session in sessions for action, ms in session.samples if action != "open"]
+    by_action = {}
+    for action, ms in timed:
+        by_action.setdefault(action, []).append(ms)
+
+    return {
+        "sessions": n_sessions,
+        "duration_s": round(elapsed, 2),
+        "reruns": len(timed),
+        "throughput_rps": round(len(timed) / elapsed, 2) if elapsed else 0.0,
+        "errors": sum(session.errors for session in sessions),
+        "latency": latency_summary([ms for _, ms in timed]),
+        "by_action": {action: latency_summary(samples) for action, samples in sorted(by_action.items())},
+        "open": latency_summary([ms for session in sessions for action, ms in session.samples if action == "open"]),
+        "upstream_calls": dict(server.counts),
+        "upstream_calls_total": sum(server.counts.values()),
+        "upstream_calls_after_open": sum(server.counts.values()) - opening_calls,
+        "rss_mb": round(rss_bytes() / 2 ** 20, 1),
+        "memory_per_session_kb": round((rss_after_open - rss_before) / n_sessions / 1024, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive simulated dashboard sessions against the local stand-in.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10], help="concurrent sessions per step")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per step")
+    parser.add_argument("--rate", type=float, default=1.0, help="actions per second per session")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"action weights (default {DEFAULT_MIX})")
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in server latency per request (seconds)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60, help="per-rerun timeout (seconds)")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    os.environ["URBANPULSE_DATA_DIR"] = tempfile.mkdtemp(prefix="urbanpulse-load-")
+    os.environ.setdefault("OPENWEATHER_API_KEY", "stub")
+    # The stand-in has no call limit; measure the app, not the quota.
+    os.environ.setdefault("URBANPULSE_QUOTA_PER_MINUTE", "0")
+
+    from utils.stub_server import StubServer
+
+    app_path = os.path.join(ROOT, "app.py")
+    steps = []
+    with StubServer(latency=args.latency) as server:
+        os.environ["OPENWEATHER_BASE_URL"] = server.url
+        from streamlit.testing.v1 import AppTest
+
+        from utils.geo import CITIES
+
+        # Pay for imports and module-level setup once, so the first step's
+        # memory per session is not dominated by them.
+        AppTest.from_file(app_path, default_timeout=args.timeout).run()
+        _share_apptest_runtime()
+
+        for n_sessions in args.sessions:
+            step = run_step(app_path, CITIES, server, n_sessions, args.duration, args.rate, args.mix, args.seed, args.timeout)
+            steps.append(step)
+            latency = step["latency"]
+            print(
+                f"{n_sessions:>4} sessions  {step['throughput_rps']:7.2f} reruns/s  "
+                f"p50 {latency['p50_ms']:8.1f}  p95 {latency['p95_ms']:8.1f}  p99 {latency['p99_ms']:8.1f} ms  "
+                f"upstream {step['upstream_calls_total']:4d}  {step['memory_per_session_kb']:8.1f} KB/session",
+                file=sys.stderr,
+            )
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "latency_s": args.latency,
+        "rate_per_session": args.rate,
+        "mix": args.mix,
+        "steps": steps,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if any(step["errors"] for step in steps) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,275 @@
+"""UrbanPulse benchmark suite.
+
+Runs micro-benchmarks for the AQI and comfort engines, the fetch path in
+utils/api.py against the local OpenWeather stand-in, and end-to-end runs of
+app.py through Streamlit's AppTest harness. Results are written as JSON and
+compared against a stored baseline:
+
+    python -m benchmarks.run                          # compare with benchmarks/baseline.json
+    python -m benchmarks.run --latency 0.08 --output bench.json
+    python -m benchmarks.run --save-baseline          # overwrite the baseline
+    python -m benchmarks.run --only aqi comfort       # name prefixes
+
+Exit status is 1 when any benchmark's median regresses past --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+BENCHMARKS = []
+
+
+def benchmark(name, repeat=20, setup=None):
+    """Register `func` as benchmark `name`; `setup` runs before every repetition, untimed."""
+    def register(func):
+        BENCHMARKS.append((name, func, repeat, setup))
+        return func
+    return register
+
+
+def _measure(func, repeat, setup):
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+    }
+
+
+# -------------------------------
+# ENGINES
+# -------------------------------
+def _register_engine_benchmarks():
+    import numpy as np
+
+    from urbanpulse.core import calculate_comfort_score, feels_like_temp
+    from utils.aqi import compute_aqi, pm25_to_aqi
+    from utils.comfort import comfort_score, feels_like
+
+    rng = np.random.default_rng(42)
+    pm25 = rng.uniform(0, 400, 100_000)
+    temp = rng.uniform(-5, 45, 1_000_000)
+    humidity = rng.uniform(5, 100, 1_000_000)
+    wind = rng.uniform(0, 20, 1_000_000)
+    aqi = rng.uniform(0, 400, 1_000_000)
+    scalar_rows = list(zip(temp[:10_000].tolist(), humidity[:10_000].tolist(), wind[:10_000].tolist(), aqi[:10_000].tolist()))
+
+    @benchmark("aqi.pm25_scalar_1k", repeat=10)
+    def _():
+        for value in pm25[:1000].tolist():
+            pm25_to_aqi(value)
+
+    @benchmark("aqi.compute_vectorized_100k", repeat=20)
+    def _():
+        compute_aqi(pm25=pm25, pm10=pm25 * 1.6, o3=pm25 / 2, no2=pm25 / 3, co=pm25 * 10)
+
+    @benchmark("comfort.scalar_10k", repeat=5)
+    def _():
+        for t, h, w, a in scalar_rows:
+            calculate_comfort_score(t, h, a)
+            feels_like_temp(t, h, w)
+
+    @benchmark("comfort.vectorized_1m", repeat=10)
+    def _():
+        comfort_score(temp, humidity, aqi)
+        feels_like(temp, humidity, wind)
+
+    from utils.catalog import read_catalog
+
+    cities = read_catalog()
+    queries = [city.name[:n] for city in cities.cities for n in (1, 3, 6)] + ["banglore", "calcuta", "mumbi"]
+
+    @benchmark("catalog.search_uncached_per_1k", repeat=10)
+    def _():
+        # Bypasses the per-query memo; reported per 1000 queries.
+        for query in (queries * (1000 // len(queries) + 1))[:1000]:
+            cities._search(query, 8)
+
+    import pandas as pd
+
+    from urbanpulse.core import rank_frame, score_frame
+
+    board = pd.DataFrame({
+        "city": [f"City {i}" for i in range(5000)],
+        "temp": temp[:5000],
+        "humidity": humidity[:5000],
+        "wind": wind[:5000],
+        "visibility": rng.uniform(0, 10, 5000),
+        "aqi": aqi[:5000],
+    })
+
+    @benchmark("leaderboard.score_rank_5k", repeat=20)
+    def _():
+        rank_frame(score_frame(board), "comfort")
+
+
+# -------------------------------
+# FETCH PATH (LOCAL STAND-IN)
+# -------------------------------
+def _register_fetch_benchmarks():
+    from utils import api
+    from utils.geo import CITIES
+    from utils.pipeline import fetch_dashboard
+    from utils.snapshots import snapshot_dir
+
+    def cold():
+        # Live fetches publish snapshots, which would otherwise serve the next run.
+        api.clear_cache()
+        shutil.rmtree(snapshot_dir(), ignore_errors=True)
+
+    @benchmark("fetch.weather_cold", repeat=20, setup=cold)
+    def _():
+        api.get_city_weather("Delhi")
+
+    @benchmark("fetch.weather_cached", repeat=200)
+    def _():
+        api.get_city_weather("Delhi")
+
+    @benchmark("fetch.dashboard_compare_cold", repeat=20, setup=cold)
+    def _():
+        fetch_dashboard("Delhi", ["Mumbai"])
+
+    @benchmark("fetch.dashboard_compare_cached", repeat=200)
+    def _():
+        fetch_dashboard("Delhi", ["Mumbai"])
+
+    @benchmark("fetch.all_cities_cold", repeat=10, setup=cold)
+    def _():
+        from utils.pipeline import fetch_cities
+        fetch_cities(CITIES)
+
+
+# -------------------------------
+# END-TO-END SCRIPT RUNS
+# -------------------------------
+def _register_app_benchmarks():
+    from streamlit.testing.v1 import AppTest
+
+    from utils import api
+    from utils.figcache import _cache as figure_cache
+    from utils.snapshots import snapshot_dir
+
+    app_path = os.path.join(ROOT, "app.py")
+    warm = []
+
+    def cold():
+        api.clear_cache()
+        figure_cache.clear()
+        shutil.rmtree(snapshot_dir(), ignore_errors=True)
+
+    @benchmark("app.first_run_cold_cache", repeat=5, setup=cold)
+    def _():
+        AppTest.from_file(app_path, default_timeout=60).run()
+
+    def warm_up():
+        # First repetition only; a setup, so runs that skip app.* never start the app.
+        if not warm:
+            warm.append(AppTest.from_file(app_path, default_timeout=60))
+            warm[0].run()
+
+    @benchmark("app.rerun_warm", repeat=20, setup=warm_up)
+    def _():
+        warm[0].run()
+
+
+GROUPS = [_register_engine_benchmarks, _register_fetch_benchmarks, _register_app_benchmarks]
+
+
+# -------------------------------
+# RUNNER
+# -------------------------------
+def compare(results, baseline, threshold):
+    """Annotate results with the change vs. baseline; return names that regressed."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = (result["median_ms"] - base["median_ms"]) / base["median_ms"] if base["median_ms"] else 0.0
+        result["baseline_median_ms"] = base["median_ms"]
+        result["change"] = round(change, 4)
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the UrbanPulse benchmark suite.")
+    parser.add_argument("--only", nargs="*", default=[], help="benchmark name prefixes to run")
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in server latency per request (seconds)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed median slowdown before flagging (fraction)")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    os.environ["URBANPULSE_DATA_DIR"] = tempfile.mkdtemp(prefix="urbanpulse-bench-")
+    os.environ.setdefault("OPENWEATHER_API_KEY", "stub")
+    # The stand-in has no call limit; measure the app, not the quota.
+    os.environ.setdefault("URBANPULSE_QUOTA_PER_MINUTE", "0")
+
+    from utils.stub_server import StubServer
+
+    with StubServer(latency=args.latency) as server:
+        os.environ["OPENWEATHER_BASE_URL"] = server.url
+        for register in GROUPS:
+            register()
+
+        results = {}
+        for name, func, repeat, setup in BENCHMARKS:
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            results[name] = _measure(func, repeat, setup)
+            print(f"{name:<36} median {results[name]['median_ms']:10.3f} ms", file=sys.stderr)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+    regressions = compare(results, baseline, args.threshold)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "latency_s": args.latency,
+        "results": results,
+        "regressions": regressions,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        # Benchmarks left out by --only keep their previous baseline.
+        saved = dict(report, results={**baseline, **results}, regressions=[])
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(json.dumps(saved, indent=2) + "\n")
+
+    for name in regressions:
+        print(f"REGRESSION {name}: {results[name]['change']:+.0%} vs baseline", file=sys.stderr)
+    return 1 if regressions and not args.save_baseline else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
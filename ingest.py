@@ -0,0 +1,99 @@
+"""Background ingester: refreshes every city on a schedule and publishes snapshots.
+
+Run alongside the dashboard:
+
+    python ingest.py --interval 300 --jitter 30 --concurrency 4
+"""
+import argparse
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from urbanpulse.observation import ObservationBatch
+from utils import alerts, quota
+from utils.api import get_city_weather, get_city_aqi, get_city_forecast
+from utils.geo import CITIES, resolve_city
+from utils.history import record_observation
+from utils.snapshots import write_snapshot
+
+log = logging.getLogger("urbanpulse.ingest")
+
+
+def refresh_city(city, jitter=0.0):
+    if jitter:
+        time.sleep(random.uniform(0, jitter))
+    # Refreshes queue behind interactive fetches for the shared call budget.
+    with quota.priority(quota.BACKGROUND):
+        lat, lon = resolve_city(city)
+        weather = get_city_weather(city, refresh=True, coords=(lat, lon))
+        aqi = get_city_aqi(lat, lon, refresh=True)
+        try:
+            forecast = get_city_forecast(lat, lon)
+        except Exception:
+            log.exception("forecast refresh failed for %s", city)
+            forecast = None
+    record_observation(city, weather, aqi)
+    return write_snapshot(city, weather, aqi, forecast=forecast)
+
+
+def refresh_all(cities, concurrency=4, jitter=0.0):
+    """Refresh every city once; returns the number of cities that failed.
+
+    The cycle's new observations are then evaluated against the alert rules
+    as one batch.
+    """
+    failures = 0
+    snapshots = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="urbanpulse-ingest") as pool:
+        futures = {pool.submit(refresh_city, city, jitter): city for city in cities}
+        for future, city in futures.items():
+            try:
+                snapshots.append(future.result())
+            except Exception:
+                failures += 1
+                log.exception("refresh failed for %s", city)
+    batch = ObservationBatch.from_records(
+        [s["city"] for s in snapshots], [s["weather"] for s in snapshots], [s["aqi"] for s in snapshots]
+    )
+    try:
+        for alert in alerts.observe_batch(batch):
+            log.info("alert: %s", alerts.format_alert(alert))
+    except Exception:
+        log.exception("alert evaluation failed")
+    return failures
+
+
+def run(cities, interval, jitter, concurrency, stop=None):
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        started = time.monotonic()
+        failures = refresh_all(cities, concurrency, jitter)
+        elapsed = time.monotonic() - started
+        log.info("refreshed %d cities in %.1fs (%d failed)", len(cities), elapsed, failures)
+        delay = max(0.0, interval - elapsed + random.uniform(-jitter, jitter))
+        stop.wait(delay)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh UrbanPulse city snapshots on a schedule.")
+    parser.add_argument("--interval", type=float, default=300, help="seconds between refresh cycles")
+    parser.add_argument("--jitter", type=float, default=30, help="max random offset per city and per cycle (seconds)")
+    parser.add_argument("--concurrency", type=int, default=4, help="cities refreshed in parallel")
+    parser.add_argument("--once", action="store_true", help="run a single refresh cycle and exit")
+    parser.add_argument("cities", nargs="*", default=CITIES, help="cities to refresh (default: all)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.once:
+        return 1 if refresh_all(args.cities, args.concurrency, args.jitter) else 0
+    try:
+        run(args.cities, args.interval, args.jitter, args.concurrency)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
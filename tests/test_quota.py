@@ -0,0 +1,167 @@
+"""Token bucket scheduling (utils/quota.py) and the response cache's stale fallback."""
+import threading
+import time
+
+import pytest
+
+from utils import quota
+from utils.api import TTLCache
+from utils.quota import BACKGROUND, INTERACTIVE, QuotaExceeded, TokenBucket
+
+
+def bucket(**kwargs):
+    options = dict(per_minute=600, burst=3, reserve=0, max_queue=8, max_wait={INTERACTIVE: 2, BACKGROUND: 5})
+    options.update(kwargs)
+    return TokenBucket(**options)
+
+
+def drain(b):
+    while b.stats()["tokens"] >= 1:
+        b.acquire(INTERACTIVE)
+
+
+def start(b, level, order):
+    def take():
+        try:
+            b.acquire(level)
+            order.append(level)
+        except QuotaExceeded:
+            order.append("shed")
+
+    thread = threading.Thread(target=take)
+    thread.start()
+    return thread
+
+
+def wait_until_queued(b, level, count=1):
+    deadline = time.monotonic() + 2
+    while b.stats()["queued"][level] < count:
+        assert time.monotonic() < deadline, "caller never queued"
+        time.sleep(0.005)
+
+
+# -------------------------------
+# TOKEN BUCKET
+# -------------------------------
+def test_burst_is_admitted_at_once_then_refills_at_rate():
+    b = bucket()  # 10 tokens/s
+    started = time.monotonic()
+    for _ in range(3):
+        b.acquire(INTERACTIVE)
+    assert time.monotonic() - started < 0.05
+
+    b.acquire(INTERACTIVE)
+    assert time.monotonic() - started >= 0.08
+    assert b.stats()[INTERACTIVE] == {"granted": 4, "shed": 0, "waited": 1}
+
+
+def test_disabled_bucket_admits_everything():
+    b = bucket(per_minute=0)
+    for _ in range(100):
+        b.acquire(BACKGROUND)
+
+
+def test_background_leaves_the_reserve_for_interactive():
+    b = bucket(burst=3, reserve=2, per_minute=6, max_wait={INTERACTIVE: 0.1, BACKGROUND: 0.1})
+    b.acquire(BACKGROUND)
+    with pytest.raises(QuotaExceeded):
+        b.acquire(BACKGROUND)
+    b.acquire(INTERACTIVE)
+    b.acquire(INTERACTIVE)
+
+
+def test_throttle_admits_nothing_until_it_expires():
+    b = bucket(per_minute=6000)
+    b.throttle(0.2)
+    started = time.monotonic()
+    b.acquire(INTERACTIVE)
+    assert time.monotonic() - started >= 0.15
+
+
+# -------------------------------
+# PRIORITY AND SHEDDING
+# -------------------------------
+def test_waiting_interactive_caller_is_served_before_background():
+    b = bucket(per_minute=300)  # one token every 0.2 s
+    drain(b)
+    order = []
+    background = start(b, BACKGROUND, order)
+    wait_until_queued(b, BACKGROUND)
+    interactive = start(b, INTERACTIVE, order)
+    background.join()
+    interactive.join()
+    assert order == [INTERACTIVE, BACKGROUND]
+
+
+def test_priority_context_sets_the_default_level():
+    b = bucket(burst=3, reserve=2, max_wait={INTERACTIVE: 0.05, BACKGROUND: 0.05}, per_minute=6)
+    with quota.priority(BACKGROUND):
+        assert quota.current_priority() == BACKGROUND
+        b.acquire()
+        with pytest.raises(QuotaExceeded):
+            b.acquire()
+    assert quota.current_priority() == INTERACTIVE
+    b.acquire()
+
+
+def test_full_queue_sheds_immediately():
+    b = bucket(per_minute=60, max_queue=1)
+    drain(b)
+    order = []
+    waiter = start(b, INTERACTIVE, order)
+    wait_until_queued(b, INTERACTIVE)
+
+    started = time.monotonic()
+    with pytest.raises(QuotaExceeded, match="queue_full"):
+        b.acquire(INTERACTIVE)
+    assert time.monotonic() - started < 0.1
+    waiter.join()
+    assert order == [INTERACTIVE]
+    assert b.stats()[INTERACTIVE]["shed"] == 1
+
+
+def test_caller_is_shed_when_no_token_can_arrive_in_time():
+    b = bucket(per_minute=6, max_wait={INTERACTIVE: 0.5, BACKGROUND: 0.5})
+    drain(b)
+    started = time.monotonic()
+    with pytest.raises(QuotaExceeded, match="timeout"):
+        b.acquire(INTERACTIVE)
+    assert time.monotonic() - started < 0.1
+
+
+def test_processes_sharing_a_db_share_the_budget(tmp_path, monkeypatch):
+    monkeypatch.setenv("URBANPULSE_DATA_DIR", str(tmp_path))
+    first = bucket(per_minute=6, db="quota.sqlite3", max_wait={INTERACTIVE: 0.05, BACKGROUND: 0.05})
+    second = bucket(per_minute=6, db="quota.sqlite3", max_wait={INTERACTIVE: 0.05, BACKGROUND: 0.05})
+    for _ in range(3):
+        first.acquire(INTERACTIVE)
+    with pytest.raises(QuotaExceeded):
+        second.acquire(INTERACTIVE)
+
+
+# -------------------------------
+# STALE FALLBACK
+# -------------------------------
+def shed():
+    raise QuotaExceeded("upstream call budget exhausted (interactive, timeout)")
+
+
+def test_shed_call_serves_the_expired_value():
+    cache = TTLCache()
+    assert cache.get_or_fetch(("weather", "delhi"), 0, lambda: "old") == "old"
+    assert cache.get_or_fetch(("weather", "delhi"), 0, shed) == "old"
+    assert cache.stats()["weather"]["shed"] == 1
+
+
+def test_shed_call_without_a_previous_value_raises():
+    cache = TTLCache()
+    with pytest.raises(QuotaExceeded):
+        cache.get_or_fetch(("weather", "delhi"), 60, shed)
+
+
+def test_forced_refresh_never_falls_back():
+    cache = TTLCache()
+    cache.get_or_fetch(("weather", "delhi"), 60, lambda: "old")
+    with pytest.raises(QuotaExceeded):
+        cache.get_or_fetch(("weather", "delhi"), 60, shed, force=True)
+    assert cache.get_or_fetch(("weather", "delhi"), 60, shed) == "old"
@@ -0,0 +1,49 @@
+from urbanpulse.core import (
+    ALERT_RULES,
+    CompiledRules,
+    RANKINGS,
+    Recommendation,
+    Rule,
+    Snapshot,
+    aqi_categories,
+    aqi_health_advice,
+    aqi_label_color,
+    calculate_comfort_score,
+    comfort_of,
+    comparison_winner,
+    feels_like_temp,
+    get_comfort_emoji,
+    rank_frame,
+    recommendations,
+    score_frame,
+    score_snapshots,
+    snapshot_frame,
+    triggered_rules,
+)
+from urbanpulse.observation import AirQuality, Observation, ObservationBatch
+
+__all__ = [
+    "ALERT_RULES",
+    "AirQuality",
+    "CompiledRules",
+    "Observation",
+    "ObservationBatch",
+    "RANKINGS",
+    "Recommendation",
+    "Rule",
+    "Snapshot",
+    "aqi_categories",
+    "aqi_health_advice",
+    "aqi_label_color",
+    "calculate_comfort_score",
+    "comfort_of",
+    "comparison_winner",
+    "feels_like_temp",
+    "get_comfort_emoji",
+    "rank_frame",
+    "recommendations",
+    "score_frame",
+    "score_snapshots",
+    "snapshot_frame",
+    "triggered_rules",
+]
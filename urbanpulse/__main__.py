@@ -0,0 +1,3 @@
+from urbanpulse.cli import main
+
+raise SystemExit(main())
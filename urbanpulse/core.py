@@ -0,0 +1,279 @@
+"""Headless UrbanPulse logic: pure functions over city snapshots.
+
+Nothing here imports Streamlit, so the dashboard, the CLI and batch jobs
+share one implementation.
+"""
+from collections import namedtuple
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import numpy as np
+
+from urbanpulse.observation import AirQuality, Observation
+from utils import comfort
+
+Recommendation = namedtuple("Recommendation", ["title", "description", "color"])
+
+
+@dataclass
+class Snapshot:
+    city: str
+    temp: float
+    humidity: float
+    wind: float
+    pressure: float
+    visibility: float
+    condition: str
+    icon: str
+    sunrise: int
+    sunset: int
+    aqi: float
+    pm25: float
+    co: float
+    no2: float
+    o3: float
+    overall_aqi: Optional[float] = None
+    dominant: str = ""
+    observed_at: Optional[int] = None
+
+    @classmethod
+    def from_payload(cls, city, weather, aqi):
+        """Build a snapshot from an Observation and an AirQuality (or their dict forms)."""
+        weather = Observation.coerce(weather)
+        aqi = AirQuality.coerce(aqi)
+        return cls(
+            city=city,
+            temp=weather.temp,
+            humidity=weather.humidity,
+            wind=weather.wind,
+            pressure=weather.pressure,
+            visibility=weather.visibility,
+            condition=weather.condition,
+            icon=weather.icon,
+            sunrise=weather.sunrise,
+            sunset=weather.sunset,
+            aqi=aqi.aqi,
+            pm25=aqi.pm25,
+            co=aqi.co,
+            no2=aqi.no2,
+            o3=aqi.o3,
+            overall_aqi=aqi.overall_aqi if aqi.overall_aqi is not None else aqi.aqi,
+            dominant=aqi.dominant or "",
+            observed_at=weather.observed_at,
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+
+# -----------------------------
+# SCALAR SCORES
+# -----------------------------
+def aqi_label_color(aqi):
+    if aqi <= 50:
+        return "Good", "#10b981", "😊"
+    elif aqi <= 100:
+        return "Moderate", "#facc15", "😐"
+    elif aqi <= 200:
+        return "Poor", "#fb923c", "😷"
+    else:
+        return "Very Poor", "#ef4444", "🚨"
+
+
+def aqi_health_advice(aqi):
+    if aqi <= 50:
+        return "✅ Safe for all outdoor activities"
+    elif aqi <= 100:
+        return "⚠️ Sensitive groups should limit prolonged outdoor exertion"
+    elif aqi <= 200:
+        return "🚨 Everyone should reduce outdoor exertion"
+    else:
+        return "❌ Avoid all outdoor activities"
+
+
+def calculate_comfort_score(temp, humidity, aqi):
+    """Calculate a comfort score (0-100) based on weather conditions"""
+    return float(comfort.comfort_score(temp, humidity, aqi))
+
+
+def get_comfort_emoji(score):
+    if score >= 80: return "🌟"
+    elif score >= 60: return "👍"
+    elif score >= 40: return "😐"
+    else: return "😰"
+
+
+def feels_like_temp(temp, humidity, wind):
+    """Calculate feels-like temperature"""
+    return float(comfort.feels_like(temp, humidity, wind))
+
+
+# -----------------------------
+# ALERT RULES
+# -----------------------------
+# One row per condition, most urgent first. A rule fires when `field`
+# crosses `threshold` in the direction of `op` and, for stateful alerting,
+# stays active until the value is back past `clear` (hysteresis).
+Rule = namedtuple("Rule", ["name", "field", "op", "threshold", "clear", "title", "description", "color"])
+
+ALERT_RULES = (
+    Rule("heat", "temp", ">", 35, 33, "🌡️ High Temperature Alert",
+         "Stay hydrated and avoid direct sun exposure between 11 AM - 4 PM", "#ef4444"),
+    Rule("cold", "temp", "<", 15, 17, "🧥 Cold Weather",
+         "Wear warm clothing and stay protected from wind chill", "#3b82f6"),
+    Rule("poor_air", "aqi", ">", 100, 90, "😷 Poor Air Quality",
+         "Wear an N95 mask outdoors and use air purifiers indoors", "#fb923c"),
+    Rule("humid", "humidity", ">", 70, 65, "💧 High Humidity",
+         "Use dehumidifiers indoors and stay in air-conditioned spaces", "#06b6d4"),
+    Rule("windy", "wind", ">", 10, 8, "🌪️ Windy Conditions",
+         "Secure loose objects and avoid high-rise areas", "#8b5cf6"),
+)
+
+
+def triggered_rules(snapshot, rules=ALERT_RULES):
+    """Rules whose threshold a single snapshot is past (no hysteresis)."""
+    fired = []
+    for rule in rules:
+        value = getattr(snapshot, rule.field)
+        if value > rule.threshold if rule.op == ">" else value < rule.threshold:
+            fired.append(rule)
+    return fired
+
+
+class CompiledRules:
+    """A rule table compiled to arrays, evaluated over whole batches at once.
+
+    Each rule becomes a row of a (rules x observations) mask: values are
+    gathered per rule's field and multiplied by +1 (">") or -1 ("<") so every
+    comparison is a single `>` against the threshold.
+    """
+
+    def __init__(self, rules=ALERT_RULES):
+        for rule in rules:
+            if rule.op not in (">", "<"):
+                raise ValueError(f"{rule.name}: unsupported operator {rule.op!r}")
+        self.rules = tuple(rules)
+        self.names = tuple(rule.name for rule in self.rules)
+        self.fields = tuple(dict.fromkeys(rule.field for rule in self.rules))
+        self._field_index = np.array([self.fields.index(rule.field) for rule in self.rules], dtype=int)
+        sign = np.array([1.0 if rule.op == ">" else -1.0 for rule in self.rules])[:, None]
+        self._sign = sign
+        self._threshold = np.array([rule.threshold for rule in self.rules], dtype=float)[:, None] * sign
+        self._clear = np.array([rule.clear for rule in self.rules], dtype=float)[:, None] * sign
+
+    def masks(self, columns):
+        """(trigger, release) boolean arrays of shape (rules, observations).
+
+        `columns` maps each field to an array of values; NaN neither
+        triggers nor releases.
+        """
+        values = np.vstack([np.asarray(columns[field], dtype=float) for field in self.fields])
+        values = values[self._field_index] * self._sign
+        return values > self._threshold, values <= self._clear
+
+    def step(self, active, columns):
+        """Next active state for each (rule, observation) given the current one."""
+        trigger, release = self.masks(columns)
+        return np.where(active, ~release, trigger)
+
+
+# -----------------------------
+# SNAPSHOT-LEVEL RESULTS
+# -----------------------------
+def comfort_of(snapshot):
+    return calculate_comfort_score(snapshot.temp, snapshot.humidity, snapshot.aqi)
+
+
+def recommendations(snapshot, comfort_score=None):
+    """Personalized recommendations for a snapshot, most urgent first."""
+    if comfort_score is None:
+        comfort_score = comfort_of(snapshot)
+    recs = [
+        Recommendation(rule.title, rule.description, rule.color)
+        for rule in triggered_rules(snapshot)
+    ]
+
+    if comfort_score > 80:
+        recs.append(Recommendation("✨ Perfect Weather", "Great day for outdoor activities and exercise!", "#10b981"))
+
+    if not recs:
+        recs.append(Recommendation("👍 Normal Conditions", "Weather conditions are moderate. Enjoy your day!", "#10b981"))
+
+    return recs
+
+
+def comparison_winner(first, second):
+    """City with the higher comfort score; ties go to the second city, as on the dashboard."""
+    return first.city if comfort_of(first) > comfort_of(second) else second.city
+
+
+def score_snapshots(snapshots):
+    """Score many snapshots at once.
+
+    Comfort and feels-like are computed in one vectorized pass; returns one
+    dict per snapshot with the snapshot fields plus `comfort`, `feels_like`,
+    `aqi_category` and `recommendations` (titles).
+    """
+    if not snapshots:
+        return []
+    temp = np.array([s.temp for s in snapshots], dtype=float)
+    humidity = np.array([s.humidity for s in snapshots], dtype=float)
+    wind = np.array([s.wind for s in snapshots], dtype=float)
+    aqi = np.array([s.aqi for s in snapshots], dtype=float)
+
+    scores = comfort.comfort_score(temp, humidity, aqi)
+    feels = comfort.feels_like(temp, humidity, wind)
+
+    results = []
+    for snapshot, score, feel in zip(snapshots, scores, feels):
+        row = snapshot.to_dict()
+        row["comfort"] = float(score)
+        row["feels_like"] = float(feel)
+        row["aqi_category"] = aqi_label_color(snapshot.aqi)[0]
+        row["recommendations"] = [rec.title for rec in recommendations(snapshot, float(score))]
+        results.append(row)
+    return results
+
+
+# -----------------------------
+# COLUMNAR SCORING & RANKING
+# -----------------------------
+# Leaderboard sort keys: label -> (column, ascending for "best first").
+RANKINGS = {
+    "Comfort Score": ("comfort", False),
+    "AQI (PM2.5)": ("aqi", True),
+    "Temperature": ("temp", False),
+    "Feels Like": ("feels_like", False),
+    "Humidity": ("humidity", True),
+    "Wind Speed": ("wind", False),
+}
+
+
+def snapshot_frame(snapshots):
+    """A DataFrame with one row per snapshot and one column per Snapshot field."""
+    import pandas as pd
+
+    return pd.DataFrame([s.to_dict() for s in snapshots])
+
+
+def aqi_categories(aqi):
+    """aqi_label_color's category for every value of an array."""
+    aqi = np.asarray(aqi, dtype=float)
+    return np.select([aqi <= 50, aqi <= 100, aqi <= 200], ["Good", "Moderate", "Poor"], "Very Poor")
+
+
+def score_frame(df):
+    """Add `comfort`, `feels_like` and `aqi_category` columns to a snapshot frame in one pass."""
+    scored = comfort.comfort_frame(df)
+    df = df.copy()
+    df["comfort"] = scored["comfort"]
+    df["feels_like"] = scored["feels_like"]
+    df["aqi_category"] = aqi_categories(df["aqi"])
+    return df
+
+
+def rank_frame(df, column, ascending=False):
+    """Rows sorted on `column` (ties by city name) with a 1-based `rank` column."""
+    ranked = df.sort_values([column, "city"], ascending=[ascending, True], kind="stable", ignore_index=True)
+    ranked.insert(0, "rank", np.arange(1, len(ranked) + 1))
+    return ranked
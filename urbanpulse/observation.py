@@ -0,0 +1,183 @@
+"""Compact records for parsed OpenWeather responses.
+
+Responses are parsed once, at fetch time, into records that keep only the
+fields UrbanPulse uses; caches and snapshots hold these instead of the
+nested JSON:
+
+    Observation       current weather for one place (__slots__)
+    AirQuality        one air-pollution reading (__slots__)
+    ObservationBatch  many rows as one NumPy array per field, e.g. a
+                      forecast series or a batch of cities
+
+Every record round-trips through `to_dict()` / `from_dict()` for the JSON
+snapshot store; `from_dict` also accepts a raw OpenWeather response, so
+snapshots written before records existed still load.
+"""
+import sys
+
+import numpy as np
+
+
+class _Record:
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            raise TypeError(f"{type(self).__name__}: unknown fields {', '.join(values)}")
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    @classmethod
+    def coerce(cls, value):
+        """`value` itself if it is already a record, else parsed from a dict."""
+        return value if isinstance(value, cls) else cls.from_dict(value)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.to_dict().items())
+        return f"{type(self).__name__}({fields})"
+
+
+class Observation(_Record):
+    """Current weather at one place; visibility in km, times as Unix seconds."""
+
+    __slots__ = (
+        "temp", "humidity", "wind", "pressure", "visibility",
+        "condition", "icon", "sunrise", "sunset", "observed_at", "fetched_at",
+    )
+
+    @classmethod
+    def from_response(cls, data, fetched_at=None):
+        """Parse an OpenWeather /data/2.5/weather response."""
+        main = data["main"]
+        return cls(
+            temp=main["temp"],
+            humidity=main["humidity"],
+            wind=data["wind"]["speed"],
+            pressure=main["pressure"],
+            visibility=data.get("visibility", 10000) / 1000,
+            # Interned: a handful of distinct values shared by every city.
+            condition=sys.intern(data["weather"][0]["description"].title()),
+            icon=sys.intern(data["weather"][0]["icon"]),
+            sunrise=data["sys"]["sunrise"],
+            sunset=data["sys"]["sunset"],
+            observed_at=data.get("dt"),
+            fetched_at=data.get("fetched_at", fetched_at),
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        if "main" in data:
+            return cls.from_response(data)
+        return super().from_dict(data)
+
+
+class AirQuality(_Record):
+    """One air-pollution reading: concentrations in μg/m³ and the derived AQIs.
+
+    `shared_from` and `nearest_km` are set when the reading was interpolated
+    from nearby coordinates rather than fetched for this one.
+    """
+
+    __slots__ = (
+        "aqi", "pm25", "pm10", "co", "no2", "o3", "overall_aqi", "dominant",
+        "fetched_at", "shared_from", "nearest_km",
+    )
+
+
+# Forecast series keep only the columns the dashboard reads.
+FORECAST_FIELDS = ("ts", "temp", "temp_min", "temp_max", "humidity")
+
+
+class ObservationBatch:
+    """Many rows as one NumPy array per field (struct of arrays).
+
+    `timezone` is the UTC offset in seconds of the place a series belongs
+    to (forecasts), 0 otherwise.
+    """
+
+    __slots__ = ("columns", "timezone")
+
+    def __init__(self, columns, timezone=0):
+        self.columns = {name: np.asarray(values) for name, values in columns.items()}
+        self.timezone = timezone
+
+    @classmethod
+    def from_records(cls, cities, observations, readings=None):
+        """One row per city from parallel lists of Observation and AirQuality records."""
+        columns = {"city": np.array(cities, dtype=object)}
+        for name in Observation.__slots__:
+            columns[name] = np.array([getattr(o, name) for o in observations], dtype=_dtype(name))
+        for name in AirQuality.__slots__ if readings is not None else ():
+            if name not in columns:
+                columns[name] = np.array([getattr(r, name) for r in readings], dtype=_dtype(name))
+        return cls(columns)
+
+    @classmethod
+    def forecast(cls, data, timezone=None):
+        """A forecast series of FORECAST_FIELDS from a column dict.
+
+        Accepts the stored form and older snapshots (raw "dt" key, extra
+        fields, no temp_min / temp_max); a batch is returned unchanged.
+        """
+        if isinstance(data, cls):
+            return data
+        fallback = {"ts": "dt", "temp_min": "temp", "temp_max": "temp"}
+        columns = {
+            name: np.asarray(data[name if name in data else fallback[name]], dtype=np.int64 if name == "ts" else float)
+            for name in FORECAST_FIELDS
+        }
+        return cls(columns, data.get("timezone", 0) if timezone is None else timezone)
+
+    @classmethod
+    def from_dict(cls, data):
+        columns = {name: values for name, values in data.items() if name != "timezone"}
+        if "dt" in columns:
+            columns["ts"] = columns.pop("dt")
+        return cls(columns, data.get("timezone", 0))
+
+    @classmethod
+    def coerce(cls, value):
+        return value if isinstance(value, cls) else cls.from_dict(value)
+
+    def to_dict(self):
+        data = {"timezone": self.timezone}
+        data.update((name, values.tolist()) for name, values in self.columns.items())
+        return data
+
+    def to_frame(self):
+        """A DataFrame over the same columns (numeric columns are not copied)."""
+        import pandas as pd
+
+        return pd.DataFrame(self.columns, copy=False)
+
+    @property
+    def fields(self):
+        return tuple(self.columns)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __repr__(self):
+        return f"ObservationBatch({len(self)} rows: {', '.join(self.columns)})"
+
+
+def _dtype(name):
+    return object if name in ("condition", "icon", "dominant") else float
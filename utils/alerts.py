@@ -0,0 +1,232 @@
+"""Stateful alerting over the observation stream, with a SQLite sink.
+
+Every new observation (from the ingester and from live dashboard fetches)
+is run through the rule table in urbanpulse.core. A batch is evaluated for
+all cities and rules at once with CompiledRules; each (city, rule) keeps an
+active flag, so an alert is written once when its threshold is crossed and
+once more when the value is back past the rule's clear level. Observations
+no newer than the last one evaluated for a city are ignored, so re-publishing
+a cached response never re-fires; a batch with nothing newer than this
+process has already seen doesn't touch the database at all.
+
+State and alerts live in one SQLite file (URBANPULSE_ALERTS_DB in the data
+directory) and every batch is one write transaction, so several producer
+processes can share it. Consumers poll by id:
+
+    python -m utils.alerts --follow
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from urbanpulse.core import ALERT_RULES, CompiledRules
+from utils.storage import data_path
+
+ALERTS_DB = os.getenv("URBANPULSE_ALERTS_DB", "alerts.sqlite3")
+
+FIRED = "fired"
+CLEARED = "cleared"
+
+Alert = namedtuple("Alert", ["id", "ts", "city", "rule", "state", "value"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,
+    city TEXT NOT NULL,
+    rule TEXT NOT NULL,
+    state TEXT NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS alert_state (
+    city TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    active TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+_compiled = CompiledRules(ALERT_RULES)
+RULES_BY_NAME = {rule.name: rule for rule in ALERT_RULES}
+
+_local = threading.local()
+_lock = threading.Lock()
+# key -> newest observation time this process knows was evaluated.
+_last_observed = {}
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(data_path(ALERTS_DB), timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _load_state(conn, keys):
+    """{key: (last_ts, active rule names)} for the cities in `keys` seen before."""
+    state = {}
+    keys = list(keys)
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        rows = conn.execute(
+            f"SELECT city, ts, active FROM alert_state WHERE city IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        for key, ts, active in rows:
+            state[key] = (ts, set(active.split()))
+    return state
+
+
+def observe(cities, ts, columns):
+    """Evaluate a batch of observations; returns the Alerts written.
+
+    `cities` and `ts` are sequences with one entry per observation and
+    `columns` maps every rule field to a matching array of values. A city may
+    appear more than once; its observations are applied in time order.
+    """
+    cities = list(cities)
+    if not cities:
+        return []
+    ts = np.asarray(ts, dtype=np.int64)
+    keys = np.array([city.strip().lower() for city in cities], dtype=object)
+    fresh = np.array([t > _last_observed.get(key, -1) for key, t in zip(keys, ts.tolist())], dtype=bool)
+    if not fresh.any():
+        return []
+    if not fresh.all():
+        cities = [city for city, keep in zip(cities, fresh) if keep]
+        ts, keys = ts[fresh], keys[fresh]
+    columns = {field: np.asarray(columns[field], dtype=float)[fresh] for field in _compiled.fields}
+
+    # Split the batch into waves holding at most one observation per city,
+    # oldest first; a stream batch is almost always a single wave.
+    order = np.lexsort((ts, keys))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = keys[order][1:] != keys[order][:-1]
+    starts = np.flatnonzero(first)
+    wave = np.arange(len(order)) - np.repeat(starts, np.diff(np.append(starts, len(order))))
+
+    conn = _connect()
+    events = []
+    with _lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = _load_state(conn, set(keys))
+            names = {}
+            for w in range(int(wave.max()) + 1):
+                rows = order[wave == w]
+                row_keys = keys[rows]
+                last = np.array([state.get(key, (-1, ()))[0] for key in row_keys], dtype=np.int64)
+                rows = rows[ts[rows] > last]
+                if not len(rows):
+                    continue
+                row_keys = keys[rows]
+                active = np.array(
+                    [[rule in state.get(key, (0, ()))[1] for key in row_keys] for rule in _compiled.names],
+                    dtype=bool,
+                ).reshape(len(_compiled.names), len(rows))
+                new = _compiled.step(active, {field: values[rows] for field, values in columns.items()})
+
+                for r, i in zip(*np.nonzero(new != active)):
+                    row = rows[i]
+                    rule = _compiled.rules[r]
+                    events.append((int(ts[row]), cities[row], rule.name, FIRED if new[r, i] else CLEARED,
+                                   float(columns[rule.field][row])))
+                for i, row in enumerate(rows):
+                    on = {_compiled.names[r] for r in np.flatnonzero(new[:, i])}
+                    state[row_keys[i]] = (int(ts[row]), on)
+                    names[row_keys[i]] = cities[row]
+
+            alerts = []
+            for event in events:
+                cursor = conn.execute("INSERT INTO alerts (ts, city, rule, state, value) VALUES (?, ?, ?, ?, ?)", event)
+                alerts.append(Alert(cursor.lastrowid, *event))
+            conn.executemany(
+                "INSERT OR REPLACE INTO alert_state VALUES (?, ?, ?, ?)",
+                [(key, names[key], state[key][0], " ".join(sorted(state[key][1]))) for key in names],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        for key, (last, _) in state.items():
+            _last_observed[key] = max(last, _last_observed.get(key, -1))
+    return alerts
+
+
+def observe_batch(batch):
+    """observe() for an ObservationBatch of cities, keyed on their observation time."""
+    if not len(batch):
+        return []
+    ts = np.nan_to_num(batch["observed_at"].astype(float), nan=time.time())
+    return observe(batch["city"], ts, batch.columns)
+
+
+# -------------------------------
+# CONSUMERS
+# -------------------------------
+def poll_alerts(after_id=0, city=None, limit=100):
+    """Alerts with id > `after_id`, oldest first; pass the last id seen to poll again."""
+    sql = "SELECT id, ts, city, rule, state, value FROM alerts WHERE id > ?"
+    params = [int(after_id)]
+    if city is not None:
+        sql += " AND lower(city) = ?"
+        params.append(city.strip().lower())
+    sql += " ORDER BY id LIMIT ?"
+    params.append(int(limit))
+    return [Alert(*row) for row in _connect().execute(sql, params)]
+
+
+def latest_alert_id():
+    return _connect().execute("SELECT COALESCE(MAX(id), 0) FROM alerts").fetchone()[0]
+
+
+def active_alerts(city=None):
+    """{city: [rule names]} for cities with at least one active alert."""
+    sql = "SELECT name, active FROM alert_state WHERE active != ''"
+    params = []
+    if city is not None:
+        sql += " AND city = ?"
+        params.append(city.strip().lower())
+    return {name: active.split() for name, active in _connect().execute(sql, params)}
+
+
+def format_alert(alert):
+    rule = RULES_BY_NAME.get(alert.rule)
+    title = rule.title if rule is not None else alert.rule
+    if alert.state == CLEARED:
+        title += " cleared"
+    return f"{title}: {alert.city} ({rule.field if rule else 'value'} {alert.value:g})"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print UrbanPulse alerts as they are written.")
+    parser.add_argument("--after", type=int, default=0, help="only alerts with a larger id")
+    parser.add_argument("--city", help="only alerts for this city")
+    parser.add_argument("--follow", action="store_true", help="keep polling for new alerts")
+    parser.add_argument("--interval", type=float, default=5, help="seconds between polls with --follow")
+    args = parser.parse_args(argv)
+
+    after = args.after
+    while True:
+        for alert in poll_alerts(after, args.city, limit=1000):
+            stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(alert.ts))
+            print(f"{alert.id:>6}  {stamp}  {format_alert(alert)}", flush=True)
+            after = alert.id
+        if not args.follow:
+            return 0
+        try:
+            time.sleep(args.interval)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
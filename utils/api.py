@@ -1,8 +1,45 @@
 import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from urbanpulse.observation import AirQuality, Observation, ObservationBatch
+from utils import circuit, metrics, quota
+from utils.aqi import compute_aqi, pm25_to_aqi
+from utils.spatial import GridIndex, idw_weights
+
+# Point at a local stand-in (see utils/stub_server.py) for offline runs.
+BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org").rstrip("/")
+BASE_WEATHER_URL = f"{BASE_URL}/data/2.5/weather"
+BASE_AIR_URL = f"{BASE_URL}/data/2.5/air_pollution"
+BASE_FORECAST_URL = f"{BASE_URL}/data/2.5/forecast"
+BASE_GEO_URL = f"{BASE_URL}/geo/1.0/direct"
 
-BASE_WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
-BASE_AIR_URL = "https://api.openweathermap.org/data/2.5/air_pollution"
+WEATHER_TTL = float(os.getenv("URBANPULSE_WEATHER_TTL", "600"))
+AQI_TTL = float(os.getenv("URBANPULSE_AQI_TTL", "900"))
+FORECAST_TTL = float(os.getenv("URBANPULSE_FORECAST_TTL", "1800"))
+GEO_TTL = 24 * 3600
+CACHE_MAXSIZE = int(os.getenv("URBANPULSE_CACHE_MAXSIZE", "1024"))
+COORD_PRECISION = int(os.getenv("URBANPULSE_COORD_PRECISION", "2"))
+# AQI readings are shared with requests this close to, and this soon after,
+# an upstream reading (0 km disables sharing).
+AQI_SHARE_RADIUS_KM = float(os.getenv("URBANPULSE_AQI_SHARE_RADIUS_KM", "5"))
+AQI_SHARE_MAX_AGE = float(os.getenv("URBANPULSE_AQI_SHARE_MAX_AGE", str(AQI_TTL)))
+AQI_SHARE_MAX_POINTS = 4
+
+HTTP_POOL_SIZE = int(os.getenv("URBANPULSE_HTTP_POOL_SIZE", "32"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("URBANPULSE_HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("URBANPULSE_HTTP_READ_TIMEOUT", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("URBANPULSE_HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("URBANPULSE_HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("URBANPULSE_HTTP_BACKOFF_MAX", "8"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 
 def get_api_key():
@@ -12,53 +49,413 @@ def get_api_key():
     return api_key
 
 
-def get_city_weather(city):
-    api_key = get_api_key()
-    params = {"q": city, "appid": api_key, "units": "metric"}
-    res = requests.get(BASE_WEATHER_URL, params=params)
+# -------------------------------
+# POOLED HTTP CLIENT
+# -------------------------------
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Module-level keep-alive session shared by every fetch in the process."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, pool_block=True)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _retry_after(res):
+    value = res.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt):
+    # Full jitter: spread retries from many sessions across the whole window.
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+
+def http_get(url, params):
+    """GET with connect/read timeouts and bounded retry on 429/5xx.
+
+    Retry-After is honoured (capped at HTTP_BACKOFF_MAX); other retries use
+    jittered exponential backoff. The final response is returned after
+    raise_for_status(). Every attempt takes a token from the shared call
+    budget first (see utils/quota.py) and may raise quota.QuotaExceeded.
+    Calls to an endpoint whose breaker is open fail fast with
+    circuit.CircuitOpen (see utils/circuit.py).
+    """
+    endpoint = url.rsplit("/", 1)[-1]
+    breaker = circuit.breaker(endpoint)
+    breaker.before_call()
+    try:
+        res = _get_with_retries(url, params, endpoint)
+    except (requests.ConnectionError, requests.Timeout):
+        breaker.record_failure()
+        raise
+    except quota.QuotaExceeded:
+        breaker.abort_probe()
+        raise
+
+    if res.status_code in RETRY_STATUSES:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    if res.status_code == 429:
+        quota.throttle(_retry_after(res) or HTTP_BACKOFF_MAX)
     res.raise_for_status()
-    return res.json()
+    return res
+
+
+def _get_with_retries(url, params, endpoint):
+    session = get_session()
+    timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    attempt = 0
+    while True:
+        quota.acquire()
+        try:
+            with metrics.span("urbanpulse_upstream_seconds", endpoint=endpoint):
+                res = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            metrics.inc("urbanpulse_upstream_errors_total", endpoint=endpoint, kind=type(exc).__name__)
+            if attempt >= HTTP_MAX_RETRIES:
+                raise
+            time.sleep(_backoff(attempt))
+            attempt += 1
+            continue
+
+        metrics.inc("urbanpulse_upstream_requests_total", endpoint=endpoint, status=res.status_code)
+        if res.status_code in RETRY_STATUSES and attempt < HTTP_MAX_RETRIES:
+            delay = _retry_after(res)
+            if delay is None:
+                delay = _backoff(attempt)
+            if res.status_code == 429:
+                quota.throttle(delay)
+            res.close()
+            time.sleep(min(delay, HTTP_BACKOFF_MAX))
+            attempt += 1
+            continue
+
+        return res
+
+
+# -------------------------------
+# SHARED TTL CACHE (PROCESS-WIDE)
+# -------------------------------
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def _is_shed(exc):
+    if isinstance(exc, (quota.QuotaExceeded, circuit.CircuitOpen)):
+        return True
+    response = getattr(exc, "response", None)
+    return isinstance(exc, requests.HTTPError) and response is not None and response.status_code == 429
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry TTL and single-flight loading.
+
+    Concurrent callers asking for a key that is already being fetched wait
+    on that fetch instead of issuing their own upstream request. Expired
+    entries stay until evicted: when the call budget is exhausted, the
+    endpoint's breaker is open or upstream answers 429, the last value is
+    served instead of an error.
+    """
+
+    def __init__(self, maxsize=CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _count(self, namespace, field):
+        counters = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "coalesced": 0, "shed": 0})
+        counters[field] = counters.get(field, 0) + 1
+
+    def count(self, namespace, field):
+        """Bump a counter for a lookup served outside the cache (e.g. a shared reading)."""
+        with self._lock:
+            self._count(namespace, field)
+
+    def peek(self, key):
+        """The fresh value for `key`, or None; counted as a hit when found."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            self._count(key[0], "hits")
+            return entry[1]
+
+    def get_or_fetch(self, key, ttl, fetch, force=False):
+        """Return the cached value for `key`, calling `fetch()` once when it is missing or expired.
+
+        When the call is shed (quota, open breaker, 429) the last value is
+        returned instead, even if expired. `force` skips a fresh entry and
+        never falls back, so a refresh either gets new data or fails.
+        """
+        namespace = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not force and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._count(namespace, "hits")
+                return entry[1]
+
+            call = self._inflight.get(key)
+            if call is not None:
+                self._count(namespace, "coalesced")
+                leader = False
+            else:
+                call = self._inflight[key] = _InFlight()
+                self._count(namespace, "misses")
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fetch()
+        except BaseException as exc:
+            if entry is not None and not force and _is_shed(exc):
+                with self._lock:
+                    self._count(namespace, "shed")
+                call.value = entry[1]
+                return call.value
+            call.error = exc
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (time.monotonic() + ttl, call.value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            return call.value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            stats = {namespace: dict(counters) for namespace, counters in self._stats.items()}
+            stats["size"] = len(self._entries)
+            return stats
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+
+_cache = TTLCache()
+
+
+def cache_stats():
+    """Hit/miss/coalesced counters per endpoint, plus current cache size."""
+    return _cache.stats()
+
+
+def clear_cache():
+    _cache.clear()
+    _aqi_index.clear()
+
+
+def _cache_metrics():
+    rows = []
+    for namespace, stats in cache_stats().items():
+        if not isinstance(stats, dict):
+            rows.append(("urbanpulse_cache_" + namespace, {}, stats))
+            continue
+        for field, value in stats.items():
+            rows.append((f"urbanpulse_cache_{field}_total", {"namespace": namespace}, value))
+    return rows
+
+
+metrics.register_collector(_cache_metrics)
+
+
+def _coord_key(lat, lon):
+    return round(float(lat), COORD_PRECISION), round(float(lon), COORD_PRECISION)
 
 
 # -------------------------------
-# PM2.5 → AQI (US EPA STANDARD)
+# UPSTREAM FETCHES
 # -------------------------------
-def pm25_to_aqi(pm25):
-    breakpoints = [
-        (0.0, 12.0, 0, 50),
-        (12.1, 35.4, 51, 100),
-        (35.5, 55.4, 101, 150),
-        (55.5, 150.4, 151, 200),
-        (150.5, 250.4, 201, 300),
-        (250.5, 350.4, 301, 400),
-        (350.5, 500.4, 401, 500),
-    ]
-
-    for c_low, c_high, aqi_low, aqi_high in breakpoints:
-        if c_low <= pm25 <= c_high:
-            return round(
-                ((aqi_high - aqi_low) / (c_high - c_low)) * (pm25 - c_low) + aqi_low
-            )
-
-    return 500
-
-
-def get_city_aqi(lat, lon):
+def _fetch_city_weather(city, coords=None):
     api_key = get_api_key()
-    params = {"lat": lat, "lon": lon, "appid": api_key}
-    res = requests.get(BASE_AIR_URL, params=params)
-    res.raise_for_status()
+    params = {"appid": api_key, "units": "metric"}
+    if coords is not None:
+        params["lat"], params["lon"] = coords
+    else:
+        params["q"] = city
+    data = http_get(BASE_WEATHER_URL, params).json()
+    # Stamped with when we received it, as opposed to OpenWeather's
+    # measurement time (`observed_at`).
+    return Observation.from_response(data, fetched_at=time.time())
+
+
+def get_city_weather(city, refresh=False, coords=None):
+    """Current weather, looked up by `coords` (lat, lon) when given, else by name."""
+    if coords is not None:
+        coords = _coord_key(*coords)
+        key = ("weather",) + coords
+    else:
+        key = ("weather", city.strip().lower())
+    return _cache.get_or_fetch(key, WEATHER_TTL, lambda: _fetch_city_weather(city, coords), force=refresh)
+
+
+def _fetch_geocode(city):
+    api_key = get_api_key()
+    params = {"q": city, "limit": 1, "appid": api_key}
+    results = http_get(BASE_GEO_URL, params).json()
+    if not results:
+        raise LookupError(f"Unknown city: {city}")
+    return results[0]["lat"], results[0]["lon"]
+
+
+def geocode_city(city):
+    key = ("geo", city.strip().lower())
+    return _cache.get_or_fetch(key, GEO_TTL, lambda: _fetch_geocode(city))
 
-    data = res.json()
+
+def _aqi_reading(pm25, pm10, co, no2, o3, fetched_at):
+    overall = compute_aqi(pm25=pm25, pm10=pm10, o3=o3, no2=no2, co=co)
+    return AirQuality(
+        aqi=pm25_to_aqi(pm25),
+        pm25=pm25,
+        pm10=pm10,
+        co=co,
+        no2=no2,
+        o3=o3,
+        overall_aqi=int(overall.aqi),
+        dominant=sys.intern(str(overall.dominant)),
+        fetched_at=fetched_at,
+    )
+
+
+def _fetch_city_aqi(lat, lon):
+    api_key = get_api_key()
+    params = {"lat": lat, "lon": lon, "appid": api_key}
+    data = http_get(BASE_AIR_URL, params).json()
     components = data["list"][0]["components"]
 
-    pm25 = components["pm2_5"]
-    aqi = pm25_to_aqi(pm25)
+    return _aqi_reading(
+        pm25=components["pm2_5"],
+        pm10=components.get("pm10"),
+        co=components["co"],
+        no2=components["no2"],
+        o3=components["o3"],
+        fetched_at=time.time(),
+    )
+
+
+# Upstream AQI readings by coordinate, so nearby requests can share them.
+_aqi_index = GridIndex(cell_km=max(AQI_SHARE_RADIUS_KM, 1.0))
+
+
+def _shared_aqi(lat, lon):
+    """A reading blended from recent upstream readings within the share radius, or None.
+
+    Pollutant concentrations are inverse-distance weighted and the AQI
+    values recomputed from the blend.
+    """
+    nearby = _aqi_index.near(lat, lon, AQI_SHARE_RADIUS_KM, AQI_SHARE_MAX_AGE, limit=AQI_SHARE_MAX_POINTS)
+    if not nearby:
+        return None
+    weights = idw_weights([distance for distance, _, _ in nearby])
+    readings = [reading for _, reading, _ in nearby]
+
+    def blend(field):
+        pairs = [(w, getattr(r, field)) for w, r in zip(weights, readings) if getattr(r, field) is not None]
+        total = sum(w for w, _ in pairs)
+        return sum(w * v for w, v in pairs) / total if total else None
+
+    shared = _aqi_reading(
+        pm25=blend("pm25"),
+        pm10=blend("pm10"),
+        co=blend("co"),
+        no2=blend("no2"),
+        o3=blend("o3"),
+        fetched_at=min(stamp for _, _, stamp in nearby),
+    )
+    shared.shared_from = len(nearby)
+    shared.nearest_km = round(nearby[0][0], 2)
+    return shared
+
+
+def get_city_aqi(lat, lon, refresh=False):
+    """Air quality at a coordinate.
+
+    An exact cached reading is used first, then one shared from recent
+    readings within AQI_SHARE_RADIUS_KM; only then is upstream called.
+    `refresh` always calls upstream.
+    """
+    # Coordinates are rounded before both the cache lookup and the upstream
+    # call, so every key maps to exactly one request.
+    lat, lon = _coord_key(lat, lon)
+    key = ("aqi", lat, lon)
+    if not refresh and AQI_SHARE_RADIUS_KM > 0:
+        reading = _cache.peek(key)
+        if reading is not None:
+            return reading
+        reading = _shared_aqi(lat, lon)
+        if reading is not None:
+            _cache.count("aqi", "shared")
+            return reading
+
+    reading = _cache.get_or_fetch(key, AQI_TTL, lambda: _fetch_city_aqi(lat, lon), force=refresh)
+    _aqi_index.add(lat, lon, reading, stamp=reading.fetched_at)
+    return reading
+
+
+def _fetch_city_forecast(lat, lon):
+    api_key = get_api_key()
+    params = {"lat": lat, "lon": lon, "appid": api_key, "units": "metric"}
+    data = http_get(BASE_FORECAST_URL, params).json()
+    entries = data["list"]
+
+    # Column-oriented and trimmed to what the dashboard plots.
+    return ObservationBatch.forecast(
+        {
+            "ts": [e["dt"] for e in entries],
+            "temp": [e["main"]["temp"] for e in entries],
+            "temp_min": [e["main"]["temp_min"] for e in entries],
+            "temp_max": [e["main"]["temp_max"] for e in entries],
+            "humidity": [e["main"]["humidity"] for e in entries],
+        },
+        timezone=data.get("city", {}).get("timezone", 0),
+    )
+
 
-    return {
-        "aqi": aqi,
-        "pm25": pm25,
-        "co": components["co"],
-        "no2": components["no2"],
-        "o3": components["o3"]
-    }
+def get_city_forecast(lat, lon, refresh=False):
+    """5-day / 3-hour forecast for a coordinate, as parallel columns."""
+    lat, lon = _coord_key(lat, lon)
+    key = ("forecast", lat, lon)
+    return _cache.get_or_fetch(key, FORECAST_TTL, lambda: _fetch_city_forecast(lat, lon), force=refresh)
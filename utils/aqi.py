@@ -0,0 +1,115 @@
+"""Vectorized US EPA AQI engine.
+
+Concentrations are accepted as scalars or NumPy arrays in the units
+OpenWeather reports (µg/m³ for every pollutant) and converted to the EPA
+table units internally. Breakpoints are looked up with `np.searchsorted`
+on each band's upper edge, so readings that fall between two published
+bands (e.g. PM2.5 = 12.05) take the start of the next band instead of
+falling through.
+"""
+import math
+from bisect import bisect_left
+from collections import namedtuple
+
+import numpy as np
+
+POLLUTANTS = ("pm25", "pm10", "o3", "no2", "co")
+
+_INDEX_BANDS = [(0, 50), (51, 100), (101, 150), (151, 200), (201, 300), (301, 400), (401, 500)]
+# The 8-hour O3 table stops at Very Unhealthy; EPA reads higher
+# concentrations off the 1-hour table, whose 205-404 ppb band is 201-300.
+_O3_INDEX_BANDS = _INDEX_BANDS[:5] + _INDEX_BANDS[4:]
+
+# (c_low, c_high) per band, in EPA units: µg/m³ for PM, ppb for O3/NO2, ppm for CO.
+_BREAKPOINTS = {
+    "pm25": [(0.0, 12.0), (12.1, 35.4), (35.5, 55.4), (55.5, 150.4), (150.5, 250.4), (250.5, 350.4), (350.5, 500.4)],
+    "pm10": [(0, 54), (55, 154), (155, 254), (255, 354), (355, 424), (425, 504), (505, 604)],
+    # 8-hour O3 up to 204 ppb, then the 1-hour bands from 205 ppb (see _O3_INDEX_BANDS).
+    "o3": [(0, 54), (55, 70), (71, 85), (86, 105), (106, 204), (205, 404), (405, 504), (505, 604)],
+    "no2": [(0, 53), (54, 100), (101, 360), (361, 649), (650, 1249), (1250, 1649), (1650, 2049)],
+    "co": [(0.0, 4.4), (4.5, 9.4), (9.5, 12.4), (12.5, 15.4), (15.5, 30.4), (30.5, 40.4), (40.5, 50.4)],
+}
+
+# µg/m³ → EPA units at 25 °C / 1 atm (24.45 / molecular weight).
+_UNIT_SCALE = {
+    "pm25": 1.0,
+    "pm10": 1.0,
+    "o3": 24.45 / 48.00,
+    "no2": 24.45 / 46.01,
+    "co": 24.45 / 28.01 / 1000,
+}
+
+
+class _Table:
+    def __init__(self, breakpoints, index_bands=_INDEX_BANDS):
+        self.c_low = np.array([low for low, _ in breakpoints], dtype=float)
+        self.c_high = np.array([high for _, high in breakpoints], dtype=float)
+        self.i_low = np.array([low for low, _ in index_bands], dtype=float)
+        self.i_high = np.array([high for _, high in index_bands], dtype=float)
+        self.slope = (self.i_high - self.i_low) / (self.c_high - self.c_low)
+        # Plain-float copies for the scalar path.
+        self.bands = list(zip(self.c_low.tolist(), self.c_high.tolist(), self.i_low.tolist(), self.slope.tolist()))
+        self.highs = self.c_high.tolist()
+
+
+_TABLES = {
+    name: _Table(bp, _O3_INDEX_BANDS if name == "o3" else _INDEX_BANDS) for name, bp in _BREAKPOINTS.items()
+}
+
+AQIResult = namedtuple("AQIResult", ["aqi", "dominant", "sub_indices"])
+
+
+def sub_index(pollutant, concentration, convert=True):
+    """AQI sub-index for one pollutant; NaN concentrations give NaN."""
+    table = _TABLES[pollutant]
+    conc = np.asarray(concentration, dtype=float)
+    if convert:
+        conc = conc * _UNIT_SCALE[pollutant]
+    conc = np.maximum(conc, 0.0)
+
+    band = np.minimum(np.searchsorted(table.c_high, conc, side="left"), len(table.c_high) - 1)
+    c_low = table.c_low[band]
+    clamped = np.clip(conc, c_low, table.c_high[band])
+    index = table.slope[band] * (clamped - c_low) + table.i_low[band]
+    index = np.where(conc > table.c_high[-1], 500.0, np.rint(index))
+    return np.where(np.isnan(conc), np.nan, index)
+
+
+def compute_aqi(**concentrations):
+    """Overall AQI and dominant pollutant for any subset of POLLUTANTS.
+
+    Each keyword takes a scalar or array (µg/m³); arrays broadcast together.
+    Returns an AQIResult whose `aqi` is the max sub-index, `dominant` the
+    pollutant name that produced it ("" where every input is NaN) and
+    `sub_indices` a dict of the per-pollutant arrays.
+    """
+    names = [name for name in POLLUTANTS if concentrations.get(name) is not None]
+    unknown = set(concentrations) - set(POLLUTANTS)
+    if unknown:
+        raise ValueError(f"Unknown pollutant(s): {', '.join(sorted(unknown))}")
+    if not names:
+        raise ValueError("compute_aqi needs at least one pollutant")
+
+    subs = {name: sub_index(name, concentrations[name]) for name in names}
+    stacked = np.stack(np.broadcast_arrays(*subs.values()))
+    filled = np.where(np.isnan(stacked), -np.inf, stacked)
+    best = np.argmax(filled, axis=0)
+    aqi = np.take_along_axis(stacked, best[np.newaxis], axis=0)[0]
+    dominant = np.where(np.isnan(aqi), "", np.array(names)[best])
+    return AQIResult(aqi, dominant, subs)
+
+
+def pm25_to_aqi(pm25):
+    """AQI for one PM2.5 reading, or None when it is missing (NaN).
+
+    Same table and rounding as sub_index, looked up with bisect so a single
+    reading doesn't pay for NumPy.
+    """
+    conc = float(pm25)
+    if math.isnan(conc):
+        return None
+    table = _TABLES["pm25"]
+    if conc > table.highs[-1]:
+        return 500
+    c_low, c_high, i_low, slope = table.bands[min(bisect_left(table.highs, max(conc, 0.0)), len(table.bands) - 1)]
+    return int(round(slope * (min(max(conc, c_low), c_high) - c_low) + i_low))
@@ -0,0 +1,222 @@
+"""On-disk city catalog with a prefix and fuzzy search index.
+
+The catalog is a TSV file (name, state, country, lat, lon, population,
+aliases) at URBANPULSE_CITY_CATALOG, defaulting to the seed catalog in
+data/cities.tsv. It is read and indexed on first use only.
+
+Search matches the query against the start of every word of a city's name
+and aliases ("delhi" finds "New Delhi"), most populous first; when that
+yields too few matches it falls back to trigram similarity, so typos such
+as "banglore" still find Bangalore.
+
+A full catalog can be built from GeoNames' cities export:
+
+    python -m utils.catalog cities15000.txt --admin1 admin1CodesASCII.txt \\
+        --countries countryInfo.txt --output data/cities.tsv
+"""
+import argparse
+import bisect
+import heapq
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATALOG_PATH = os.getenv("URBANPULSE_CITY_CATALOG", os.path.join(ROOT, "data", "cities.tsv"))
+
+COLUMNS = ("name", "state", "country", "lat", "lon", "population", "aliases")
+FUZZY_MIN_SCORE = 0.35
+
+City = namedtuple("City", "name state country lat lon population label")
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse punctuation to single spaces."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text.casefold()).split())
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CityCatalog:
+    def __init__(self, rows):
+        """`rows` are (name, state, country, lat, lon, population, aliases) tuples."""
+        rows = sorted(rows, key=lambda row: -row[5])
+        # The most populous city with a name is labelled by the name alone;
+        # the rest are qualified with their state (or country).
+        seen = set()
+        cities = []
+        for name, state, country, lat, lon, population, _ in rows:
+            key = normalize(name)
+            label = name if key not in seen else f"{name}, {state or country}"
+            seen.add(key)
+            cities.append(City(name, state, country, lat, lon, population, label))
+        self.cities = cities
+
+        # Ids are positions in `cities`, so a smaller id is a bigger city.
+        by_label = {}
+        prefix_entries = []
+        postings = {}
+        gram_counts = []
+        for city_id, (city, row) in enumerate(zip(cities, rows)):
+            names = {normalize(city.name)} | {normalize(alias) for alias in row[6] if alias.strip()}
+            by_label.setdefault(normalize(city.label), city_id)
+            grams = set()
+            for name in names:
+                by_label.setdefault(name, city_id)
+                words = name.split()
+                for i in range(len(words)):
+                    prefix_entries.append((" ".join(words[i:]), city_id))
+                grams |= _trigrams(name)
+            for gram in grams:
+                postings.setdefault(gram, []).append(city_id)
+            gram_counts.append(len(grams))
+        prefix_entries.sort()
+        self._keys = [key for key, _ in prefix_entries]
+        self._ids = [city_id for _, city_id in prefix_entries]
+        self._by_label = by_label
+        self._postings = postings
+        self._gram_counts = gram_counts
+        self.search = lru_cache(maxsize=4096)(self._search)
+
+    def __len__(self):
+        return len(self.cities)
+
+    def get(self, name):
+        """The city for a label, name or alias (most populous on ties), or None."""
+        city_id = self._by_label.get(normalize(name))
+        return None if city_id is None else self.cities[city_id]
+
+    def _prefix(self, query, limit):
+        lo = bisect.bisect_left(self._keys, query)
+        hi = bisect.bisect_left(self._keys, query + "\x7f", lo)
+        return heapq.nsmallest(limit, set(self._ids[lo:hi]))
+
+    def _fuzzy(self, query, limit, exclude):
+        grams = _trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = []
+        for city_id, count in shared.items():
+            if city_id in exclude:
+                continue
+            score = 2 * count / (len(grams) + self._gram_counts[city_id])
+            if score >= FUZZY_MIN_SCORE:
+                scored.append((-score, city_id))
+        return [city_id for _, city_id in heapq.nsmallest(limit, scored)]
+
+    def _search(self, query, limit=10):
+        query = normalize(query)
+        if not query:
+            return tuple(self.cities[:limit])
+        ids = self._prefix(query, limit)
+        if len(ids) < limit and len(query) >= 4:
+            ids += self._fuzzy(query, limit - len(ids), set(ids))
+        return tuple(self.cities[city_id] for city_id in ids)
+
+
+def read_catalog(path=CATALOG_PATH):
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        header = f.readline().rstrip("\n").split("\t")
+        if tuple(header[:6]) != COLUMNS[:6]:
+            raise ValueError(f"{path}: expected columns {', '.join(COLUMNS)}")
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 6:
+                continue
+            aliases = fields[6].split(",") if len(fields) > 6 and fields[6] else []
+            rows.append((fields[0], fields[1], fields[2], float(fields[3]), float(fields[4]), int(fields[5] or 0), aliases))
+    return CityCatalog(rows)
+
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def catalog():
+    """The process-wide catalog, loaded on first use."""
+    global _catalog
+    if _catalog is None:
+        with _lock:
+            if _catalog is None:
+                _catalog = read_catalog()
+    return _catalog
+
+
+def search_cities(query, limit=10):
+    return catalog().search(query, limit)
+
+
+def find_city(name):
+    return catalog().get(name)
+
+
+# -------------------------------
+# GEONAMES IMPORT
+# -------------------------------
+def _read_names(path, key_column, name_column):
+    names = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) > max(key_column, name_column):
+                names[fields[key_column]] = fields[name_column]
+    return names
+
+
+def build_from_geonames(cities_path, output, admin1_path=None, countries_path=None, min_population=0):
+    """Convert a GeoNames cities export into the catalog TSV; returns the row count."""
+    states = _read_names(admin1_path, 0, 1) if admin1_path else {}
+    countries = _read_names(countries_path, 0, 4) if countries_path else {}
+    rows = []
+    with open(cities_path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            population = int(fields[14] or 0)
+            if population < min_population:
+                continue
+            name, ascii_name, code, admin1 = fields[1], fields[2], fields[8], fields[10]
+            aliases = [ascii_name] if ascii_name != name else []
+            rows.append((
+                name,
+                states.get(f"{code}.{admin1}", ""),
+                countries.get(code, code),
+                round(float(fields[4]), 4),
+                round(float(fields[5]), 4),
+                population,
+                ",".join(aliases),
+            ))
+    rows.sort(key=lambda row: -row[5])
+    with open(output, "w", encoding="utf-8") as f:
+        f.write("\t".join(COLUMNS) + "\n")
+        for row in rows:
+            f.write("\t".join(str(value) for value in row) + "\n")
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the UrbanPulse city catalog from a GeoNames export.")
+    parser.add_argument("cities", help="GeoNames cities file, e.g. cities15000.txt")
+    parser.add_argument("--admin1", help="admin1CodesASCII.txt, for state names")
+    parser.add_argument("--countries", help="countryInfo.txt, for country names")
+    parser.add_argument("--min-population", type=int, default=0)
+    parser.add_argument("--output", default=CATALOG_PATH)
+    args = parser.parse_args(argv)
+    count = build_from_geonames(args.cities, args.output, args.admin1, args.countries, args.min_population)
+    print(f"wrote {count} cities to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
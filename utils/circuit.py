@@ -0,0 +1,106 @@
+"""Per-endpoint circuit breakers for upstream calls.
+
+After URBANPULSE_BREAKER_THRESHOLD consecutive failures (connection errors,
+timeouts, 5xx or 429 after retries) an endpoint's breaker opens and calls
+fail fast with CircuitOpen for URBANPULSE_BREAKER_COOLDOWN seconds. The
+next call after that is let through as a probe: success closes the
+breaker, failure opens it for another cooldown.
+"""
+import os
+import threading
+import time
+
+from utils import metrics
+
+BREAKER_THRESHOLD = int(os.getenv("URBANPULSE_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("URBANPULSE_BREAKER_COOLDOWN", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """The endpoint's breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go out now."""
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                return
+        metrics.inc("urbanpulse_breaker_rejected_total", endpoint=self.name)
+        raise CircuitOpen(f"{self.name}: upstream failing, retrying in {self.retry_in():.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                if self.state != OPEN:
+                    metrics.inc("urbanpulse_breaker_opened_total", endpoint=self.name)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def abort_probe(self):
+        """A probe ended without reaching upstream; let the next call probe instead."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+
+    def retry_in(self):
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+def breaker(name):
+    with _lock:
+        found = _breakers.get(name)
+        if found is None:
+            found = _breakers[name] = CircuitBreaker(name)
+        return found
+
+
+def breaker_states():
+    """{endpoint: (state, consecutive_failures)} for every breaker seen so far."""
+    with _lock:
+        return {name: (b.state, b.failures) for name, b in _breakers.items()}
+
+
+def reset():
+    with _lock:
+        _breakers.clear()
+
+
+def _breaker_metrics():
+    return [
+        ("urbanpulse_breaker_open", {"endpoint": name}, int(state != CLOSED))
+        for name, (state, _) in breaker_states().items()
+    ]
+
+
+metrics.register_collector(_breaker_metrics)
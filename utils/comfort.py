@@ -0,0 +1,96 @@
+"""Array-native comfort and feels-like computation.
+
+Every function accepts scalars, NumPy arrays or pandas Series. The
+original scalar `if` branches are replaced by masks, so an hourly forecast
+or a year of history is scored in one pass with the same results as a
+per-reading call (the scalar helpers in `app.py` delegate here).
+comfort_score and feels_like keep a plain-float path for single readings,
+which would otherwise pay NumPy's per-call overhead.
+"""
+import math
+
+import numpy as np
+
+FACTORS = ("Temperature", "Humidity", "Air Quality", "Wind", "Visibility")
+
+
+def _arr(values):
+    return np.asarray(values, dtype=float)
+
+
+def _scalars(*values):
+    return all(isinstance(value, (int, float)) for value in values)
+
+
+def temperature_score(temp):
+    return np.maximum(0, 100 - np.abs(_arr(temp) - 25) * 3)
+
+
+def humidity_score(humidity):
+    return np.maximum(0, 100 - np.abs(_arr(humidity) - 50) * 1.5)
+
+
+def air_quality_score(aqi):
+    return np.maximum(0, 100 - _arr(aqi) * 0.8)
+
+
+def wind_score(wind):
+    return np.minimum(100, _arr(wind) * 20)
+
+
+def visibility_score(visibility_km):
+    return np.minimum(100, _arr(visibility_km) * 10)
+
+
+def comfort_factors(temp, humidity, aqi, wind, visibility_km):
+    """Per-factor 0-100 scores, keyed by the radar chart's factor labels."""
+    return {
+        "Temperature": temperature_score(temp),
+        "Humidity": humidity_score(humidity),
+        "Air Quality": air_quality_score(aqi),
+        "Wind": wind_score(wind),
+        "Visibility": visibility_score(visibility_km),
+    }
+
+
+def comfort_score(temp, humidity, aqi):
+    if _scalars(temp, humidity, aqi):
+        if math.isnan(temp + humidity + aqi):
+            return math.nan
+        total = max(0, 100 - abs(temp - 25) * 3) + max(0, 100 - abs(humidity - 50) * 1.5) + max(0, 100 - aqi * 0.8)
+        return round(total / 3, 1)
+    total = temperature_score(temp) + humidity_score(humidity) + air_quality_score(aqi)
+    return np.round(total / 3, 1)
+
+
+def feels_like(temp, humidity, wind):
+    if _scalars(temp, humidity, wind):
+        if temp > 27:
+            value = temp + (0.5555 * (6.11 * math.exp(5417.7530 * ((1/273.16) - (1/(273.15+temp)))) * (humidity/100) - 10))
+        elif temp < 10:
+            wind_pow = wind ** 0.16
+            value = 13.12 + 0.6215*temp - 11.37*wind_pow + 0.3965*temp*wind_pow
+        else:
+            value = temp
+        return round(value, 1)
+    temp, humidity, wind = _arr(temp), _arr(humidity), _arr(wind)
+    with np.errstate(invalid="ignore"):
+        heat_index = temp + (0.5555 * (6.11 * np.exp(5417.7530 * ((1/273.16) - (1/(273.15+temp)))) * (humidity/100) - 10))
+        wind_pow = wind ** 0.16
+        wind_chill = 13.12 + 0.6215*temp - 11.37*wind_pow + 0.3965*temp*wind_pow
+    return np.round(np.select([temp > 27, temp < 10], [heat_index, wind_chill], temp), 1)
+
+
+def comfort_frame(df, temp="temp", humidity="humidity", wind="wind", visibility="visibility", aqi="aqi"):
+    """Score a DataFrame in one vectorized pass.
+
+    Returns a new DataFrame (same index) with `comfort`, `feels_like` and one
+    column per comfort factor.
+    """
+    import pandas as pd
+
+    factors = comfort_factors(df[temp], df[humidity], df[aqi], df[wind], df[visibility])
+    out = pd.DataFrame(factors, index=df.index)
+    out["comfort"] = comfort_score(df[temp], df[humidity], df[aqi])
+    out["feels_like"] = feels_like(df[temp], df[humidity], df[wind])
+    return out
@@ -0,0 +1,139 @@
+"""Process-wide cache of built Plotly figures, keyed by a hash of their inputs.
+
+Building a figure (plotly.express in particular) dominates rerun CPU once
+data fetches are cached. Every chart is built by a pure function of its
+inputs, so identical inputs across reruns and sessions can reuse one
+figure. Entries are bounded by count and by an estimate of their data size
+(8 bytes per point across all trace arrays), evicting least-recently-used
+first.
+"""
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import metrics
+
+FIGURE_CACHE_MAXSIZE = int(os.getenv("URBANPULSE_FIGURE_CACHE_MAXSIZE", "256"))
+FIGURE_CACHE_MAX_BYTES = int(os.getenv("URBANPULSE_FIGURE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def _feed(digest, value):
+    if isinstance(value, np.ndarray):
+        digest.update(f"nd:{value.dtype.str}:{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif hasattr(value, "to_numpy") and hasattr(value, "index"):
+        # pandas Series / Index / DataFrame: hash values and labels.
+        import pandas as pd
+
+        digest.update(type(value).__name__.encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        if hasattr(value, "columns"):
+            _feed(digest, list(value.columns))
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}:{len(value)}".encode())
+        for item in value:
+            _feed(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f"dict:{len(value)}".encode())
+        for key in sorted(value, key=repr):
+            _feed(digest, key)
+            _feed(digest, value[key])
+    else:
+        digest.update(pickle.dumps(value, protocol=4))
+
+
+# Trace properties that hold per-point data; everything else is small layout.
+_DATA_PROPS = ("x", "y", "z", "lat", "lon", "r", "theta", "values", "labels", "text", "hovertext", "customdata")
+_TRACE_OVERHEAD = 2048
+
+
+def estimate_size(figure):
+    """Approximate bytes held by a figure: 8 per data point plus a fixed cost per trace."""
+    size = 0
+    for trace in figure.data:
+        size += _TRACE_OVERHEAD
+        for prop in _DATA_PROPS:
+            values = getattr(trace, prop, None)
+            if values is not None and not isinstance(values, str) and hasattr(values, "__len__"):
+                size += 8 * int(np.size(values))
+    return size
+
+
+def data_hash(*args, **kwargs):
+    digest = hashlib.blake2b(digest_size=16)
+    _feed(digest, args)
+    _feed(digest, kwargs)
+    return digest.hexdigest()
+
+
+class FigureCache:
+    def __init__(self, maxsize=FIGURE_CACHE_MAXSIZE, max_bytes=FIGURE_CACHE_MAX_BYTES):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, name, build, *args, **kwargs):
+        key = (name, data_hash(*args, **kwargs))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        figure = build(*args, **kwargs)
+        size = estimate_size(figure)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (figure, size)
+                self._bytes += size
+            while self._entries and (len(self._entries) > self.maxsize or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return figure
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "bytes": self._bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_cache = FigureCache()
+
+
+def cached_figure(name, build, *args, **kwargs):
+    """Return `build(*args, **kwargs)`, reusing a cached figure for identical inputs.
+
+    The returned figure is shared; callers must not mutate it.
+    """
+    return _cache.get_or_build(name, build, *args, **kwargs)
+
+
+def figure_cache_stats():
+    return _cache.stats()
+
+
+def _figure_metrics():
+    stats = figure_cache_stats()
+    return [
+        ("urbanpulse_figure_cache_hits_total", {}, stats["hits"]),
+        ("urbanpulse_figure_cache_misses_total", {}, stats["misses"]),
+        ("urbanpulse_figure_cache_entries", {}, stats["size"]),
+        ("urbanpulse_figure_cache_bytes", {}, stats["bytes"]),
+    ]
+
+
+metrics.register_collector(_figure_metrics)
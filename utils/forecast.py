@@ -0,0 +1,25 @@
+import pandas as pd
+
+
+def forecast_frame(forecast):
+    """DataFrame of the 3-hour forecast (an ObservationBatch), indexed by the city's local time."""
+    frame = forecast.to_frame()
+    local = pd.to_datetime(frame.pop("ts"), unit="s") + pd.Timedelta(seconds=forecast.timezone)
+    return frame.set_index(local.rename("time"))
+
+
+def daily_summary(forecast):
+    """Daily high / low / mean temperature from the 3-hour series.
+
+    One grouped aggregation over the whole series; days are calendar days in
+    the city's local time.
+    """
+    frame = forecast_frame(forecast)
+    daily = frame.groupby(frame.index.normalize()).agg(
+        high=("temp_max", "max"),
+        low=("temp_min", "min"),
+        mean=("temp", "mean"),
+        humidity=("humidity", "mean"),
+    )
+    daily.index.name = "date"
+    return daily
@@ -0,0 +1,75 @@
+import json
+import threading
+
+from utils.catalog import find_city
+from utils.storage import data_path, read_json
+
+CITIES = ["Delhi", "Mumbai", "Bangalore", "Pune", "Hyderabad", "Bhopal", "Chennai", "Kolkata"]
+
+# Seed coordinates so the default cities never need a geocode round-trip.
+CITY_COORDS = {
+    "delhi": (28.6667, 77.2167),
+    "mumbai": (19.0144, 72.8479),
+    "bangalore": (12.9762, 77.6033),
+    "pune": (18.5196, 73.8553),
+    "hyderabad": (17.3753, 78.4744),
+    "bhopal": (23.2667, 77.4),
+    "chennai": (13.0878, 80.2785),
+    "kolkata": (22.5697, 88.3697),
+}
+
+# One JSON line per geocoded name, appended as names are resolved. The older
+# single-object file is still read so existing tables carry over.
+GEOCACHE_FILE = "geocache.jsonl"
+LEGACY_GEOCACHE_FILE = "geocache.json"
+
+_table = None
+_lock = threading.Lock()
+
+
+def _load():
+    global _table
+    if _table is None:
+        table = dict(CITY_COORDS)
+        for name, coords in read_json(data_path(LEGACY_GEOCACHE_FILE), {}).items():
+            table[name] = tuple(coords)
+        try:
+            with open(data_path(GEOCACHE_FILE), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        name, lat, lon = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue  # a torn last line from an interrupted append
+                    table[name] = (lat, lon)
+        except FileNotFoundError:
+            pass
+        _table = table
+    return _table
+
+
+def resolve_city(city):
+    """Return (lat, lon) for a city name or catalog label.
+
+    Seed and previously geocoded names come first, then the city catalog;
+    anything else is geocoded and persisted.
+    """
+    key = city.strip().lower()
+    with _lock:
+        coords = _load().get(key)
+    if coords is not None:
+        return coords
+
+    entry = find_city(city)
+    if entry is not None:
+        return entry.lat, entry.lon
+
+    # Imported here so the seed tables can be used (e.g. by the stand-in
+    # server) without fixing utils.api's base URL at import time.
+    from utils.api import geocode_city
+
+    coords = geocode_city(city)
+    with _lock:
+        _load()[key] = coords
+        with open(data_path(GEOCACHE_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps([key, coords[0], coords[1]]) + "\n")
+    return coords
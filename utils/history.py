@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import threading
+import time
+
+from utils.storage import data_path
+
+HISTORY_DB = os.getenv("URBANPULSE_HISTORY_DB", "history.sqlite3")
+
+FIELDS = ("temp", "humidity", "wind", "pressure", "visibility", "aqi", "pm25", "co", "no2", "o3")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS observations (
+    city TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    {", ".join(f"{field} REAL" for field in FIELDS)},
+    PRIMARY KEY (city, ts)
+) WITHOUT ROWID
+"""
+
+_local = threading.local()
+_lock = threading.Lock()
+# key -> last observation time recorded by this process.
+_last_recorded = {}
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(data_path(HISTORY_DB), timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _row(city, weather, aqi, ts):
+    return (
+        city.strip().lower(),
+        int(ts),
+        weather.temp,
+        weather.humidity,
+        weather.wind,
+        weather.pressure,
+        weather.visibility,
+        aqi.aqi,
+        aqi.pm25,
+        aqi.co,
+        aqi.no2,
+        aqi.o3,
+    )
+
+
+def record_observation(city, weather, aqi, ts=None):
+    """Append one weather/AQI observation; repeated timestamps are ignored.
+
+    `weather` and `aqi` are Observation and AirQuality records. The
+    observation time defaults to the upstream measurement time
+    (`weather.observed_at`), so re-recording a cached response is a no-op.
+    """
+    if ts is None:
+        ts = weather.observed_at or time.time()
+    key = city.strip().lower()
+    # Claim the timestamp first so concurrent publishes of one response
+    # write it once; the claim is released if the insert fails.
+    with _lock:
+        if _last_recorded.get(key) == int(ts):
+            return
+        previous = _last_recorded.get(key)
+        _last_recorded[key] = int(ts)
+    try:
+        conn = _connect()
+        with conn:
+            conn.execute(
+                f"INSERT OR IGNORE INTO observations VALUES ({', '.join('?' * (len(FIELDS) + 2))})",
+                _row(city, weather, aqi, ts),
+            )
+    except BaseException:
+        with _lock:
+            if _last_recorded.get(key) == int(ts):
+                if previous is None:
+                    del _last_recorded[key]
+                else:
+                    _last_recorded[key] = previous
+        raise
+
+
+def query_history(city, fields, since, until=None, bucket=None):
+    """Observations for a city in [since, until], oldest first.
+
+    With `bucket` (seconds) rows are downsampled to one averaged row per
+    bucket, keyed by the bucket start. Returns a list of (ts, *fields) tuples.
+    """
+    for field in fields:
+        if field not in FIELDS:
+            raise ValueError(f"Unknown history field: {field}")
+    until = time.time() if until is None else until
+    params = (city.strip().lower(), int(since), int(until))
+
+    if bucket:
+        bucket = int(bucket)
+        columns = ", ".join(f"AVG({field})" for field in fields)
+        sql = (
+            f"SELECT (ts / {bucket}) * {bucket} AS bucket_ts, {columns} FROM observations "
+            "WHERE city = ? AND ts BETWEEN ? AND ? GROUP BY bucket_ts ORDER BY bucket_ts"
+        )
+    else:
+        sql = (
+            f"SELECT ts, {', '.join(fields)} FROM observations "
+            "WHERE city = ? AND ts BETWEEN ? AND ? ORDER BY ts"
+        )
+    return _connect().execute(sql, params).fetchall()
@@ -0,0 +1,166 @@
+"""Columnar table of every published city snapshot, for ranking all cities at once.
+
+The table keeps one NumPy array per field, with a row per snapshot file in
+the snapshot store. `sync()` scans the directory and re-parses only files
+whose mtime changed since the last scan. Snapshots are published by rename,
+which also touches the directory, so when nothing was published since the
+last scan a rerun costs one stat() however many cities there are. An mtime
+within MTIME_RESOLUTION_NS of the scan isn't trusted (a later change in the
+same timestamp tick would look identical), so such a directory or file is
+checked again on the next sync. Scoring
+and ranking run over whole columns (urbanpulse.core.score_frame /
+rank_frame) and are memoised per table version.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from urbanpulse.core import Snapshot, rank_frame, score_frame
+from utils.snapshots import snapshot_dir
+from utils.storage import read_json
+
+NUMERIC = (
+    "temp", "humidity", "wind", "pressure", "visibility",
+    "aqi", "pm25", "co", "no2", "o3", "overall_aqi", "fetched_at",
+)
+TEXT = ("city", "condition")
+
+# Coarsest timestamp granularity to allow for (FAT and some network mounts: 2 s).
+MTIME_RESOLUTION_NS = 2_000_000_000
+
+
+def _values(snapshot):
+    parsed = Snapshot.from_payload(snapshot["city"], snapshot["weather"], snapshot["aqi"])
+    values = {name: getattr(parsed, name) for name in NUMERIC if name != "fetched_at"}
+    values["fetched_at"] = snapshot["fetched_at"]
+    values["city"] = parsed.city
+    values["condition"] = parsed.condition
+    return values
+
+
+class SnapshotTable:
+    def __init__(self):
+        self.directory = None
+        self.directory_mtime = None
+        self.version = 0
+        self._size = 0
+        self._rows = {}
+        self._mtimes = {}
+        self._columns = self._empty(0)
+        self._ranked = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty(capacity):
+        columns = {name: np.full(capacity, np.nan) for name in NUMERIC}
+        columns.update({name: np.empty(capacity, dtype=object) for name in TEXT})
+        return columns
+
+    def __len__(self):
+        return self._size
+
+    def _reset(self, directory):
+        self.directory = directory
+        self.directory_mtime = None
+        self._size = 0
+        self._rows.clear()
+        self._mtimes.clear()
+        self._columns = self._empty(0)
+
+    def _append(self, name):
+        capacity = len(self._columns["city"])
+        if self._size == capacity:
+            grown = self._empty(max(64, capacity * 2))
+            for column, values in self._columns.items():
+                grown[column][:capacity] = values
+            self._columns = grown
+        self._rows[name] = self._size
+        self._size += 1
+        return self._rows[name]
+
+    def _drop(self, names):
+        keep = np.ones(self._size, dtype=bool)
+        keep[[self._rows.pop(name) for name in names]] = False
+        for name in names:
+            self._mtimes.pop(name, None)
+        self._columns = {column: values[:self._size][keep] for column, values in self._columns.items()}
+        self._size = int(keep.sum())
+        order = sorted(self._rows, key=self._rows.get)
+        self._rows = {name: row for row, name in enumerate(order)}
+
+    def sync(self):
+        """Pick up new, replaced and deleted snapshots; returns the table version."""
+        directory = snapshot_dir()
+        with self._lock:
+            if directory != self.directory:
+                self._reset(directory)
+                self.version += 1
+            directory_mtime = os.stat(directory).st_mtime_ns
+            if directory_mtime == self.directory_mtime:
+                return self.version
+            # Anything modified at or after this point may change again
+            # without its mtime moving.
+            racy = time.time_ns() - MTIME_RESOLUTION_NS
+            changed = False
+            seen = set()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if not name.endswith(".json") or name.startswith("."):
+                        continue
+                    seen.add(name)
+                    mtime = entry.stat().st_mtime_ns
+                    if self._mtimes.get(name) == mtime:
+                        continue
+                    snapshot = read_json(entry.path)
+                    try:
+                        values = _values(snapshot)
+                    except (TypeError, KeyError, IndexError):
+                        continue
+                    row = self._rows.get(name)
+                    if row is None:
+                        row = self._append(name)
+                    for column, value in values.items():
+                        self._columns[column][row] = value
+                    self._mtimes[name] = mtime if mtime < racy else None
+                    changed = True
+            gone = [name for name in self._rows if name not in seen]
+            if gone:
+                self._drop(gone)
+                changed = True
+            self.directory_mtime = directory_mtime if directory_mtime < racy else None
+            if changed:
+                self.version += 1
+                self._ranked.clear()
+            return self.version
+
+    def frame(self):
+        """The table as a DataFrame (one row per city)."""
+        import pandas as pd
+
+        with self._lock:
+            return pd.DataFrame({column: values[:self._size].copy() for column, values in self._columns.items()})
+
+    def ranked(self, column, ascending=False):
+        """Scored rows ranked on `column`, memoised until the table changes."""
+        key = (self.version, column, ascending)
+        ranked = self._ranked.get(key)
+        if ranked is None:
+            ranked = rank_frame(score_frame(self.frame()), column, ascending)
+            self._ranked[key] = ranked
+        return ranked
+
+
+_table = SnapshotTable()
+
+
+def snapshot_table():
+    return _table
+
+
+def leaderboard(column="comfort", ascending=False):
+    """Every published city, scored and ranked on `column`."""
+    _table.sync()
+    return _table.ranked(column, ascending)
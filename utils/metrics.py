@@ -0,0 +1,249 @@
+"""Lightweight in-process metrics: spans, latency histograms and counters.
+
+Enable with URBANPULSE_METRICS=1. When disabled, `span()` returns a shared
+no-op context manager, `timed()` returns the function unchanged and
+`inc()` / `observe()` return immediately, so instrumented code pays almost
+nothing.
+
+Metrics are exposed in Prometheus text format by `render_prometheus()`,
+served at /metrics by the JSON API and, in the Streamlit process, by
+`start_http_server()` when URBANPULSE_METRICS_PORT is set.
+"""
+import bisect
+import contextlib
+import functools
+import os
+import threading
+import time
+
+ENABLED = os.getenv("URBANPULSE_METRICS", "") not in ("", "0", "false")
+METRICS_PORT = int(os.getenv("URBANPULSE_METRICS_PORT", "0"))
+DEBUG_PANEL = os.getenv("URBANPULSE_DEBUG_PANEL", "") not in ("", "0", "false")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NOOP = contextlib.nullcontext()
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count", "max")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bucket bound containing the q-quantile (Prometheus-style estimate)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.max
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, labels=()):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {
+                key: (list(h.counts), h.sum, h.count, h.max, h.buckets, h.quantile(0.5), h.quantile(0.95))
+                for key, h in self.histograms.items()
+            }
+        return counters, histograms
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+REGISTRY = Registry()
+
+# Extra gauges computed at scrape time, e.g. cache statistics.
+_collectors = []
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    if ENABLED:
+        REGISTRY.inc(name, value, _labels(labels))
+
+
+def observe(name, value, **labels):
+    if ENABLED:
+        REGISTRY.observe(name, value, _labels(labels))
+
+
+class _Span:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = self.labels + (("error", "true" if exc_type else "false"),)
+        REGISTRY.observe(self.name, time.perf_counter() - self.started, tuple(sorted(labels)))
+        return False
+
+
+def span(name, **labels):
+    """Time a block into the `name` histogram (seconds)."""
+    if not ENABLED:
+        return _NOOP
+    return _Span(name, _labels(labels))
+
+
+def timed(name, **labels):
+    """Decorator form of `span`; a no-op when metrics are disabled."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def register_collector(collect):
+    """Register `collect()` returning [(name, labels_dict, value), ...] samples.
+
+    Names ending in `_total` are exposed as counters, everything else as
+    gauges.
+    """
+    _collectors.append(collect)
+
+
+# -------------------------------
+# EXPOSITION
+# -------------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+    return "{" + body + "}"
+
+
+def render_prometheus():
+    """Prometheus text format: one `# TYPE` line and contiguous samples per family."""
+    counters, histograms = REGISTRY.snapshot()
+    families = {}
+
+    def family(name, kind):
+        return families.setdefault(name, (kind, []))[1]
+
+    for (name, labels), value in sorted(counters.items()):
+        family(name, "counter").append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), (counts, total, count, _, buckets, _, _) in sorted(histograms.items()):
+        lines = family(name, "histogram")
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    for collect in _collectors:
+        for name, labels, value in collect():
+            kind = "counter" if name.endswith("_total") else "gauge"
+            family(name, kind).append(f"{name}{_format_labels(_labels(labels))} {value}")
+
+    lines = []
+    for name in sorted(families):
+        kind, samples = families[name]
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def summary():
+    """Rows of (metric, labels, count, mean_ms, p50_ms, p95_ms, max_ms) for the debug panel."""
+    _, histograms = REGISTRY.snapshot()
+    rows = []
+    for (name, labels), (_, total, count, peak, _, p50, p95) in sorted(histograms.items()):
+        mean = total / count if count else 0.0
+        rows.append((name, ", ".join(f"{k}={v}" for k, v in labels), count, mean * 1000, p50 * 1000, p95 * 1000, peak * 1000))
+    return rows
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics on a daemon thread; safe to call on every rerun."""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    with _server_lock:
+        if _server is not None:
+            return _server
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        _server = ThreadingHTTPServer((host, port), Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True, name="urbanpulse-metrics").start()
+        return _server
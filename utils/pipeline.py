@@ -0,0 +1,234 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from urbanpulse.observation import AirQuality, Observation, ObservationBatch
+from utils import alerts, quota
+from utils.api import get_city_weather, get_city_aqi, get_city_forecast
+from utils.geo import resolve_city
+from utils.history import record_observation
+from utils.snapshots import SNAPSHOT_HARD_MAX_AGE, SNAPSHOT_MAX_AGE, read_snapshot, snapshot_age, write_snapshot
+
+log = logging.getLogger("urbanpulse.pipeline")
+
+FETCH_WORKERS = int(os.getenv("URBANPULSE_FETCH_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="urbanpulse-fetch")
+
+
+def _submit(func, *args):
+    # Carry the caller's context (its quota priority) into the worker thread.
+    return _executor.submit(contextvars.copy_context().run, func, *args)
+
+
+@dataclass
+class CityData:
+    city: str
+    weather: Optional[Observation] = None
+    aqi: Optional[AirQuality] = None
+    error: Optional[Exception] = None
+    forecast: Optional[ObservationBatch] = None
+    forecast_error: Optional[Exception] = None
+    fetched_at: Optional[float] = None
+    stale: bool = False
+    refresh_error: Optional[Exception] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def age(self):
+        """Seconds since the data was fetched from upstream."""
+        return max(0.0, time.time() - self.fetched_at) if self.fetched_at else 0.0
+
+
+@dataclass
+class DashboardData:
+    primary: CityData
+    compare: list = field(default_factory=list)
+
+
+def _fetched_at(weather, aqi):
+    # Both records are stamped by utils/api.py; the older one dates the pair.
+    stamps = [r.fetched_at for r in (weather, aqi) if r is not None and r.fetched_at]
+    return min(stamps) if stamps else time.time()
+
+
+def _from_snapshot(city, snapshot, stale=False, refresh_error=None):
+    return CityData(
+        city,
+        weather=snapshot["weather"],
+        aqi=snapshot["aqi"],
+        forecast=snapshot.get("forecast"),
+        fetched_at=snapshot["fetched_at"],
+        stale=stale,
+        refresh_error=refresh_error,
+    )
+
+
+def _fallback(city, snapshot, exc, with_forecast=False):
+    """Serve the last snapshot, however old, rather than fail the city."""
+    if snapshot is None:
+        return CityData(city, error=exc)
+    log.warning("serving %.0fs old snapshot for %s: %s", snapshot_age(snapshot), city, exc)
+    result = _from_snapshot(city, snapshot, stale=True, refresh_error=exc)
+    if with_forecast and not result.forecast:
+        result.forecast_error = exc
+    return result
+
+
+def _publish(city, weather, aqi, forecast, fetched_at):
+    record_observation(city, weather, aqi)
+    current = read_snapshot(city, max_age=None)
+    if current is None or current["fetched_at"] < fetched_at:
+        write_snapshot(city, weather, aqi, forecast=forecast, fetched_at=fetched_at)
+    elif forecast is not None and not current.get("forecast"):
+        # The snapshot is as new but has no forecast (it was written for a
+        # comparison city): keep its readings and add this forecast.
+        write_snapshot(city, current["weather"], current["aqi"], forecast=forecast, fetched_at=current["fetched_at"])
+    alerts.observe_batch(ObservationBatch.from_records([city], [weather], [aqi]))
+
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _refresh(city, with_forecast):
+    try:
+        with quota.priority(quota.BACKGROUND):
+            lat, lon = resolve_city(city)
+            weather = get_city_weather(city, refresh=True, coords=(lat, lon))
+            aqi = get_city_aqi(lat, lon, refresh=True)
+            forecast = None
+            if with_forecast:
+                try:
+                    forecast = get_city_forecast(lat, lon)
+                except Exception as exc:
+                    log.warning("background forecast refresh failed for %s: %s", city, exc)
+        _publish(city, weather, aqi, forecast, _fetched_at(weather, aqi))
+    except Exception as exc:
+        log.warning("background refresh failed for %s: %s", city, exc)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(city)
+
+
+def _refresh_in_background(city, with_forecast):
+    """Start one background refresh per city; repeat calls while it runs are no-ops."""
+    with _refreshing_lock:
+        if city in _refreshing:
+            return
+        _refreshing.add(city)
+    _executor.submit(_refresh, city, with_forecast)
+
+
+def refresh_in_background(cities, with_forecast=False):
+    """Publish fresh snapshots for `cities` from the executor, at background priority; returns at once."""
+    for city in cities:
+        _refresh_in_background(city, with_forecast)
+
+
+def _start_fetches(city, with_forecast):
+    # Runs on the executor so a geocode never blocks the caller. It only
+    # starts the fetches, never waits on them, so a full pool can't deadlock.
+    lat, lon = resolve_city(city)
+    return (
+        _submit(get_city_weather, city, False, (lat, lon)),
+        _submit(get_city_aqi, lat, lon),
+        _submit(get_city_forecast, lat, lon) if with_forecast else None,
+    )
+
+
+def _fetch_forecast(city):
+    lat, lon = resolve_city(city)
+    return get_city_forecast(lat, lon)
+
+
+def _start_city(city, with_forecast=False):
+    """Start one city's fetch and return a callable that waits for its CityData.
+
+    Stale-while-revalidate: a snapshot younger than SNAPSHOT_HARD_MAX_AGE is
+    returned immediately, and one past SNAPSHOT_MAX_AGE also starts a
+    background refresh; if it lacks a forecast that was asked for, only the
+    forecast is fetched. Otherwise the city is resolved on the executor and
+    weather, AQI (and optionally the forecast) are issued together; the result
+    is published as the new snapshot. If that fails, an older snapshot is
+    returned marked `stale`. A forecast failure is reported on
+    `forecast_error` without failing the city.
+    """
+    snapshot = read_snapshot(city, max_age=None)
+    if snapshot is not None and snapshot_age(snapshot) <= SNAPSHOT_HARD_MAX_AGE:
+        stale = snapshot_age(snapshot) > SNAPSHOT_MAX_AGE
+        if stale:
+            _refresh_in_background(city, with_forecast or bool(snapshot.get("forecast")))
+        result = _from_snapshot(city, snapshot, stale=stale)
+        if result.forecast or not with_forecast:
+            return lambda: result
+
+        # Snapshots written for comparison cities have no forecast; serve the
+        # readings and fetch only the forecast.
+        forecast_future = _submit(_fetch_forecast, city)
+
+        def collect_forecast():
+            try:
+                result.forecast = forecast_future.result()
+            except Exception as exc:
+                result.forecast_error = exc
+                return result
+            try:
+                _publish(city, result.weather, result.aqi, result.forecast, result.fetched_at)
+            except Exception:
+                log.exception("could not publish snapshot for %s", city)
+            return result
+
+        return collect_forecast
+
+    started = _submit(_start_fetches, city, with_forecast)
+
+    def collect():
+        try:
+            weather_future, aqi_future, forecast_future = started.result()
+            weather, aqi = weather_future.result(), aqi_future.result()
+        except Exception as exc:
+            return _fallback(city, snapshot, exc, with_forecast)
+        result = CityData(city, weather=weather, aqi=aqi, fetched_at=_fetched_at(weather, aqi))
+        if forecast_future is not None:
+            try:
+                result.forecast = forecast_future.result()
+            except Exception as exc:
+                result.forecast_error = exc
+        try:
+            _publish(city, result.weather, result.aqi, result.forecast, result.fetched_at)
+        except Exception:
+            log.exception("could not publish snapshot for %s", city)
+        return result
+
+    return collect
+
+
+def fetch_city(city, with_forecast=False):
+    """Fetch one city's weather and AQI, capturing any failure on the result."""
+    return _start_city(city, with_forecast)()
+
+
+def fetch_cities(cities, with_forecast=False):
+    """Fetch several cities concurrently, preserving input order."""
+    pending = [_start_city(city, with_forecast) for city in cities]
+    return [collect() for collect in pending]
+
+
+def fetch_dashboard(city, compare_cities=()):
+    """Fetch the primary (with forecast) and any comparison cities in parallel.
+
+    Errors are reported per city so a failing comparison never blanks the
+    primary panel.
+    """
+    primary = _start_city(city, with_forecast=True)
+    compare = [_start_city(other) for other in compare_cities]
+    return DashboardData(primary=primary(), compare=[collect() for collect in compare])
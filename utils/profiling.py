@@ -0,0 +1,104 @@
+"""Startup profiling for cold replicas.
+
+Enable with URBANPULSE_PROFILE_STARTUP=1. While enabled, every first-time
+top-level import is timed (inclusive of the modules it pulls in) and the app
+marks named sections as it renders; a report is logged after the first
+paint of each script run. Disabled, `install()` and `mark()` do nothing.
+
+With URBANPULSE_METRICS=1, marks also feed the per-section latency
+histogram `urbanpulse_section_seconds` on every rerun.
+"""
+import builtins
+import logging
+import os
+import sys
+import threading
+import time
+
+from utils import metrics
+
+ENABLED = os.getenv("URBANPULSE_PROFILE_STARTUP", "") not in ("", "0", "false")
+
+log = logging.getLogger("urbanpulse.profiling")
+
+PROCESS_START = time.perf_counter()
+
+_imports = {}
+_imports_lock = threading.Lock()
+_local = threading.local()
+_original_import = builtins.__import__
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules or getattr(_local, "depth", 0):
+        return _original_import(name, globals, locals, fromlist, level)
+
+    _local.depth = 1
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - started
+        _local.depth = 0
+        with _imports_lock:
+            _imports[name] = _imports.get(name, 0.0) + elapsed
+
+
+def install():
+    """Start timing imports. Call before any heavy import."""
+    if ENABLED and builtins.__import__ is not _timed_import:
+        builtins.__import__ = _timed_import
+
+
+def start_run():
+    """Begin timing sections for the current script run."""
+    if ENABLED or metrics.ENABLED:
+        _local.sections = []
+        _local.last = _local.run_start = time.perf_counter()
+
+
+def mark(section):
+    """Record the time since the previous mark under `section`."""
+    if not (ENABLED or metrics.ENABLED) or not hasattr(_local, "sections"):
+        return
+    now = time.perf_counter()
+    elapsed = now - _local.last
+    _local.last = now
+    if ENABLED:
+        _local.sections.append((section, elapsed))
+    metrics.observe("urbanpulse_section_seconds", elapsed, section=section)
+
+
+def finish_run():
+    """Record the whole script run's duration (metrics only)."""
+    if metrics.ENABLED and hasattr(_local, "run_start"):
+        metrics.observe("urbanpulse_rerun_seconds", time.perf_counter() - _local.run_start)
+        metrics.inc("urbanpulse_reruns_total")
+
+
+def report(first_paint_section=None):
+    """Return (imports, sections, time_to_first_paint) and log them.
+
+    `time_to_first_paint` is measured from the start of the run to the end
+    of `first_paint_section` (or of the last mark).
+    """
+    if not ENABLED or not hasattr(_local, "sections"):
+        return None
+    with _imports_lock:
+        imports = sorted(_imports.items(), key=lambda item: item[1], reverse=True)
+    sections = list(_local.sections)
+
+    elapsed = 0.0
+    first_paint = None
+    for name, seconds in sections:
+        elapsed += seconds
+        if name == first_paint_section:
+            first_paint = elapsed
+    if first_paint is None:
+        first_paint = elapsed
+
+    lines = [f"time to first paint: {first_paint * 1000:.1f} ms (process up {(time.perf_counter() - PROCESS_START):.2f} s)"]
+    lines += [f"  section {name:<24} {seconds * 1000:8.1f} ms" for name, seconds in sections]
+    lines += [f"  import  {name:<24} {seconds * 1000:8.1f} ms" for name, seconds in imports]
+    log.warning("startup profile\n%s", "\n".join(lines))
+    return imports, sections, first_paint
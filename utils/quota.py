@@ -0,0 +1,227 @@
+"""Token bucket for the OpenWeather call budget, shared across processes.
+
+Every upstream request in utils/api.py takes a token first. The bucket
+state is one row in a SQLite file (URBANPULSE_QUOTA_DB in the data
+directory), updated in a write transaction per attempt, so the dashboard,
+the API server and the ingester all draw on the same budget. The bucket
+refills at URBANPULSE_QUOTA_PER_MINUTE and holds at most URBANPULSE_QUOTA_BURST
+tokens. Callers run in a priority class:
+
+    INTERACTIVE  a user waiting on a page (the default)
+    BACKGROUND   ingestion, refreshes, backfills
+
+Background callers never take the last URBANPULSE_QUOTA_RESERVE tokens and
+step aside while any interactive caller is waiting, in any process: a
+waiting interactive caller records when it expects its token, and
+background callers hold off until then. Each class has a bounded
+queue and a maximum wait; a caller that would exceed either is shed with
+QuotaExceeded, which the response cache answers with the last value it holds.
+"""
+import contextlib
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+
+from utils import metrics
+from utils.storage import data_path
+
+QUOTA_PER_MINUTE = float(os.getenv("URBANPULSE_QUOTA_PER_MINUTE", "60"))
+QUOTA_BURST = float(os.getenv("URBANPULSE_QUOTA_BURST", "10"))
+QUOTA_RESERVE = float(os.getenv("URBANPULSE_QUOTA_RESERVE", "3"))
+QUOTA_MAX_QUEUE = int(os.getenv("URBANPULSE_QUOTA_MAX_QUEUE", "32"))
+QUOTA_INTERACTIVE_WAIT = float(os.getenv("URBANPULSE_QUOTA_INTERACTIVE_WAIT", "2"))
+QUOTA_BACKGROUND_WAIT = float(os.getenv("URBANPULSE_QUOTA_BACKGROUND_WAIT", "60"))
+# Empty keeps the bucket in memory, private to this process.
+QUOTA_DB = os.getenv("URBANPULSE_QUOTA_DB", "quota.sqlite3")
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+_priority = contextvars.ContextVar("urbanpulse_priority", default=INTERACTIVE)
+
+
+class QuotaExceeded(Exception):
+    """The call budget cannot admit this request in time."""
+
+
+@contextlib.contextmanager
+def priority(level):
+    """Run upstream calls made in this block (and this context) at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quota (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    blocked_until REAL NOT NULL,
+    interactive_until REAL NOT NULL
+)
+"""
+_FIELDS = ("tokens", "updated", "blocked_until", "interactive_until")
+
+
+class TokenBucket:
+    """Token bucket kept in memory, or in the SQLite file `db` (a data-dir name) when given."""
+
+    def __init__(self, per_minute=QUOTA_PER_MINUTE, burst=QUOTA_BURST, reserve=QUOTA_RESERVE,
+                 max_queue=QUOTA_MAX_QUEUE, max_wait=None, db=None):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, burst)
+        self.reserve = min(reserve, self.capacity - 1)
+        self.max_queue = max_queue
+        self.max_wait = max_wait or {INTERACTIVE: QUOTA_INTERACTIVE_WAIT, BACKGROUND: QUOTA_BACKGROUND_WAIT}
+        self.db = db or None
+        self._conn = None
+        self._local = {"tokens": self.capacity, "updated": time.time(), "blocked_until": 0.0, "interactive_until": 0.0}
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._cond = threading.Condition()
+        self._stats = {level: {"granted": 0, "shed": 0, "waited": 0} for level in self._waiting}
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _refill(self, state, now):
+        if now > state["updated"]:
+            state["tokens"] = min(self.capacity, state["tokens"] + (now - state["updated"]) * self.rate)
+            state["updated"] = now
+
+    @contextlib.contextmanager
+    def _state(self, now):
+        """The bucket state refilled to `now`; changes are saved on exit. Hold self._cond."""
+        if self.db is None:
+            self._refill(self._local, now)
+            yield self._local
+            return
+        if self._conn is None:
+            conn = sqlite3.connect(data_path(self.db), timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(_SCHEMA)
+            self._conn = conn
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(f"SELECT {', '.join(_FIELDS)} FROM quota WHERE id = 0").fetchone()
+            state = dict(zip(_FIELDS, row)) if row else dict(self._local, updated=now)
+            self._refill(state, now)
+            yield state
+            conn.execute("INSERT OR REPLACE INTO quota VALUES (0, ?, ?, ?, ?)", [state[f] for f in _FIELDS])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _shed(self, level, reason):
+        self._stats[level]["shed"] += 1
+        metrics.inc("urbanpulse_quota_shed_total", priority=level, reason=reason)
+        raise QuotaExceeded(f"upstream call budget exhausted ({level}, {reason})")
+
+    def _try_take(self, level, floor, now, deadline):
+        """One admission attempt: (granted, time the next attempt may succeed, yielding)."""
+        with self._state(now) as state:
+            yielding = level == BACKGROUND and (self._waiting[INTERACTIVE] or now < state["interactive_until"])
+            if now >= state["blocked_until"] and state["tokens"] - floor >= 1 and not yielding:
+                state["tokens"] -= 1
+                return True, now, False
+            ready_at = max(state["blocked_until"], now + max(0.0, 1 + floor - state["tokens"]) / self.rate)
+            if level == INTERACTIVE:
+                state["interactive_until"] = max(state["interactive_until"], min(ready_at, deadline))
+            elif yielding and not self._waiting[INTERACTIVE]:
+                # Only another process is waiting: check again once it is served.
+                ready_at = max(ready_at, state["interactive_until"])
+            return False, ready_at, yielding
+
+    def acquire(self, level=None):
+        """Take one token, waiting in priority order; raise QuotaExceeded when shed."""
+        if not self.enabled:
+            return
+        level = level or current_priority()
+        deadline = time.time() + self.max_wait[level]
+        floor = 0.0 if level == INTERACTIVE else self.reserve
+
+        with self._cond:
+            if self._waiting[level] >= self.max_queue:
+                self._shed(level, "queue_full")
+            self._waiting[level] += 1
+            waited = False
+            try:
+                while True:
+                    now = time.time()
+                    granted, ready_at, yielding = self._try_take(level, floor, now, deadline)
+                    if granted:
+                        self._stats[level]["granted"] += 1
+                        self._stats[level]["waited"] += waited
+                        return
+
+                    # Shed immediately when the next token cannot arrive in time.
+                    if ready_at > deadline and not yielding:
+                        self._shed(level, "timeout")
+                    if now >= deadline:
+                        self._shed(level, "timeout")
+                    waited = True
+                    # Tokens taken by other processes aren't notified, so
+                    # always wake by the time one could be available.
+                    self._cond.wait(min(ready_at, deadline) - now)
+            finally:
+                self._waiting[level] -= 1
+                self._cond.notify_all()
+
+    def throttle(self, seconds):
+        """Upstream said 429: admit nothing for `seconds` and start from empty."""
+        with self._cond:
+            now = time.time()
+            with self._state(now) as state:
+                state["tokens"] = 0.0
+                state["blocked_until"] = max(state["blocked_until"], now + seconds)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = {level: dict(counters) for level, counters in self._stats.items()}
+            stats["queued"] = dict(self._waiting)
+            if self.enabled:
+                with self._state(time.time()) as state:
+                    stats["tokens"] = round(state["tokens"], 2)
+            else:
+                stats["tokens"] = self.capacity
+            return stats
+
+
+_bucket = TokenBucket(db=QUOTA_DB)
+
+
+def acquire(level=None):
+    _bucket.acquire(level)
+
+
+def throttle(seconds):
+    _bucket.throttle(seconds)
+
+
+def quota_stats():
+    return _bucket.stats()
+
+
+def _quota_metrics():
+    stats = quota_stats()
+    rows = [("urbanpulse_quota_tokens", {}, stats["tokens"])]
+    for level in (INTERACTIVE, BACKGROUND):
+        rows.append(("urbanpulse_quota_queued", {"priority": level}, stats["queued"][level]))
+        rows.append(("urbanpulse_quota_granted_total", {"priority": level}, stats[level]["granted"]))
+    return rows
+
+
+metrics.register_collector(_quota_metrics)
@@ -0,0 +1,93 @@
+import os
+import re
+import threading
+import time
+
+from urbanpulse.observation import AirQuality, Observation, ObservationBatch
+from utils.storage import data_dir, read_json, write_json_atomic
+
+# Past the soft TTL a snapshot is still served, but refreshed in the
+# background; past the hard limit it is only a fallback when upstream fails.
+SNAPSHOT_MAX_AGE = float(os.getenv("URBANPULSE_SNAPSHOT_MAX_AGE", "900"))
+SNAPSHOT_HARD_MAX_AGE = float(os.getenv("URBANPULSE_SNAPSHOT_HARD_MAX_AGE", "86400"))
+
+_parsed = {}
+_lock = threading.Lock()
+
+
+def _slug(city):
+    return re.sub(r"[^a-z0-9]+", "-", city.strip().lower()).strip("-")
+
+
+def snapshot_dir():
+    path = os.path.join(data_dir(), "snapshots")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def snapshot_path(city):
+    return os.path.join(snapshot_dir(), f"{_slug(city)}.json")
+
+
+def write_snapshot(city, weather, aqi, forecast=None, fetched_at=None):
+    """Publish a city's records; returns the snapshot as read_snapshot would."""
+    snapshot = {
+        "city": city,
+        "fetched_at": time.time() if fetched_at is None else fetched_at,
+        "weather": weather,
+        "aqi": aqi,
+        "forecast": forecast,
+    }
+    write_json_atomic(snapshot_path(city), dict(
+        snapshot,
+        weather=weather.to_dict(),
+        aqi=aqi.to_dict(),
+        forecast=forecast.to_dict() if forecast is not None else None,
+    ))
+    return snapshot
+
+
+def _load(data):
+    """Snapshot JSON with its payloads parsed back into records."""
+    forecast = data.get("forecast")
+    return dict(
+        data,
+        weather=Observation.coerce(data["weather"]),
+        aqi=AirQuality.coerce(data["aqi"]),
+        forecast=ObservationBatch.forecast(forecast) if forecast else None,
+    )
+
+
+def snapshot_age(snapshot):
+    return max(0.0, time.time() - snapshot["fetched_at"])
+
+
+def read_snapshot(city, max_age=SNAPSHOT_MAX_AGE):
+    """Latest published snapshot for a city, or None if missing or too old.
+
+    `max_age=None` returns the snapshot whatever its age.
+
+    Parsed files are memoised on mtime, as records, so a rerun only re-reads
+    a city after the ingester has replaced its snapshot.
+    """
+    path = snapshot_path(city)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        cached = _parsed.get(path)
+    if cached is not None and cached[0] == mtime:
+        snapshot = cached[1]
+    else:
+        snapshot = read_json(path)
+        if snapshot is None:
+            return None
+        snapshot = _load(snapshot)
+        with _lock:
+            _parsed[path] = (mtime, snapshot)
+
+    if max_age is not None and time.time() - snapshot["fetched_at"] > max_age:
+        return None
+    return snapshot
@@ -0,0 +1,100 @@
+"""Grid index of recent point readings, for sharing them between nearby coordinates.
+
+Readings are bucketed into square cells of `cell_km` on a side (in degrees of
+latitude; longitude cells narrow towards the poles, so lookups widen their
+longitude span by 1/cos(lat)). A lookup scans only the cells that can hold
+points within the radius, then filters by great-circle distance and age.
+"""
+import math
+import threading
+import time
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def idw_weights(distances_km, power=2, exact_km=0.05):
+    """Inverse-distance weights summing to 1; a point within `exact_km` takes all the weight."""
+    for i, distance in enumerate(distances_km):
+        if distance <= exact_km:
+            return [1.0 if j == i else 0.0 for j in range(len(distances_km))]
+    raw = [1 / distance ** power for distance in distances_km]
+    total = sum(raw)
+    return [w / total for w in raw]
+
+
+class GridIndex:
+    """Points with a value and a timestamp, queryable by radius and age."""
+
+    def __init__(self, cell_km=5.0, max_points=10_000):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.max_points = max_points
+        self._cells = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def add(self, lat, lon, value, stamp=None):
+        """Insert or replace the point at (lat, lon)."""
+        stamp = time.time() if stamp is None else stamp
+        cell = self._cell(lat, lon)
+        with self._lock:
+            points = self._cells.setdefault(cell, [])
+            for i, (p_lat, p_lon, _, _) in enumerate(points):
+                if p_lat == lat and p_lon == lon:
+                    points[i] = (lat, lon, value, stamp)
+                    return
+            points.append((lat, lon, value, stamp))
+            self._size += 1
+            if self._size > self.max_points:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        cell, index = min(
+            ((cell, i) for cell, points in self._cells.items() for i in range(len(points))),
+            key=lambda item: self._cells[item[0]][item[1]][3],
+        )
+        points = self._cells[cell]
+        points.pop(index)
+        if not points:
+            del self._cells[cell]
+        self._size -= 1
+
+    def near(self, lat, lon, radius_km, max_age=None, limit=None):
+        """[(distance_km, value, stamp)] within `radius_km` and `max_age` seconds, nearest first."""
+        now = time.time()
+        lat_span = math.ceil(radius_km / KM_PER_DEGREE / self.cell_deg)
+        lon_scale = max(math.cos(math.radians(lat)), 0.01)
+        lon_span = math.ceil(radius_km / (KM_PER_DEGREE * lon_scale) / self.cell_deg)
+        row, col = self._cell(lat, lon)
+
+        found = []
+        with self._lock:
+            for r in range(row - lat_span, row + lat_span + 1):
+                for c in range(col - lon_span, col + lon_span + 1):
+                    for p_lat, p_lon, value, stamp in self._cells.get((r, c), ()):
+                        if max_age is not None and now - stamp > max_age:
+                            continue
+                        distance = haversine_km(lat, lon, p_lat, p_lon)
+                        if distance <= radius_km:
+                            found.append((distance, value, stamp))
+        found.sort(key=lambda item: item[0])
+        return found[:limit] if limit else found
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._size = 0
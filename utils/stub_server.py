@@ -0,0 +1,169 @@
+"""Local OpenWeather stand-in that replays recorded responses.
+
+Serves the four endpoints UrbanPulse uses from `fixtures/openweather/`,
+patching the city name and coordinates into each reply. Point the app at
+it with OPENWEATHER_BASE_URL:
+
+    python -m utils.stub_server --port 8089 --latency 0.05
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8089 OPENWEATHER_API_KEY=stub streamlit run app.py
+
+`GET /__stats` returns per-endpoint request counts; `GET /__reset` clears them.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from utils.geo import CITY_COORDS
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "openweather")
+
+ROUTES = {
+    "/data/2.5/weather": "weather",
+    "/data/2.5/air_pollution": "air_pollution",
+    "/data/2.5/forecast": "forecast",
+    "/geo/1.0/direct": "geo",
+}
+
+
+def load_fixtures(directory=FIXTURE_DIR):
+    fixtures = {}
+    for name in ROUTES.values():
+        with open(os.path.join(directory, f"{name}.json"), encoding="utf-8") as f:
+            fixtures[name] = json.load(f)
+    return fixtures
+
+
+def _coords(params):
+    if "lat" in params:
+        return float(params["lat"]), float(params["lon"])
+    return CITY_COORDS.get(params.get("q", "").strip().lower())
+
+
+def _respond(fixtures, endpoint, params):
+    body = copy.deepcopy(fixtures[endpoint])
+    coords = _coords(params)
+    name = params.get("q")
+    if endpoint == "geo":
+        if name:
+            body[0]["name"] = name
+        if coords:
+            body[0]["lat"], body[0]["lon"] = coords
+    elif endpoint == "forecast":
+        if coords:
+            body["city"]["coord"] = {"lat": coords[0], "lon": coords[1]}
+    else:
+        if coords:
+            body["coord"] = {"lat": coords[0], "lon": coords[1]}
+        if endpoint == "weather" and name:
+            body["name"] = name
+    return body
+
+
+class StubServer:
+    """Threaded stand-in server; usable as a context manager in-process."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, fixtures=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.fixtures = fixtures or load_fixtures()
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Send headers and body in one segment; otherwise Nagle plus
+            # delayed ACKs add ~40 ms to every keep-alive request.
+            disable_nagle_algorithm = True
+            wbufsize = 64 * 1024
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+
+                if parsed.path == "/__stats":
+                    with server._lock:
+                        return self._send(200, dict(server.counts))
+                if parsed.path == "/__reset":
+                    with server._lock:
+                        server.counts.clear()
+                    return self._send(200, {})
+
+                endpoint = ROUTES.get(parsed.path)
+                if endpoint is None:
+                    return self._send(404, {"cod": 404, "message": "Not found"})
+                if not params.get("appid"):
+                    return self._send(401, {"cod": 401, "message": "Invalid API key"})
+
+                with server._lock:
+                    server.counts[endpoint] = server.counts.get(endpoint, 0) + 1
+                delay = server.latency + random.uniform(0, server.jitter)
+                if delay:
+                    time.sleep(delay)
+                self._send(200, _respond(server.fixtures, endpoint, params))
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded OpenWeather responses locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="fixed delay per request (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay per request (seconds)")
+    args = parser.parse_args(argv)
+
+    server = StubServer(args.host, args.port, args.latency, args.jitter)
+    print(f"OpenWeather stand-in listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
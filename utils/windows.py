@@ -0,0 +1,82 @@
+"""Best-time-outside window search over hourly comfort series.
+
+Series are laid out as (..., days, 24) arrays of hourly comfort in local
+time, NaN where no data exists, so any number of cities can be searched in
+one call. Window sums come from a cumulative sum (O(n) for every window
+length) and the top-k non-overlapping windows per day are picked greedily.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.comfort import comfort_score
+from utils.forecast import forecast_frame
+
+
+def hourly_comfort(forecast, aqi):
+    """Hourly comfort for a 3-hour forecast, on whole local days.
+
+    Returns (days, values) where `days` is a DatetimeIndex of local midnights
+    and `values` a (len(days), 24) array. Hours outside the forecast span are
+    NaN. AQI is held at the current reading, as the forecast carries none.
+    """
+    frame = forecast_frame(forecast)[["temp", "humidity"]]
+    hourly = frame.resample("1h").mean().interpolate(limit_area="inside")
+    first = hourly.index[0].normalize()
+    last = hourly.index[-1].normalize() + pd.Timedelta(hours=23)
+    hourly = hourly.reindex(pd.date_range(first, last, freq="1h"))
+
+    values = comfort_score(hourly["temp"], hourly["humidity"], aqi)
+    days = pd.date_range(first, last.normalize(), freq="D")
+    return days, values.reshape(len(days), 24)
+
+
+def stack_days(series, fill=np.nan):
+    """Pad a list of (days_i, 24) arrays to a common (n, max_days, 24) array."""
+    max_days = max(values.shape[0] for values in series)
+    out = np.full((len(series), max_days, 24), fill, dtype=float)
+    for i, values in enumerate(series):
+        out[i, : values.shape[0]] = values
+    return out
+
+
+def window_means(values, window):
+    """Mean of every contiguous `window`-hour run inside each day.
+
+    `values` has shape (..., 24); the result has shape (..., 25 - window) and
+    is NaN for windows touching a missing hour.
+    """
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    sums = np.pad(np.cumsum(np.where(missing, 0.0, values), axis=-1), pad)
+    gaps = np.pad(np.cumsum(missing, axis=-1), pad)
+    totals = sums[..., window:] - sums[..., :-window]
+    holes = gaps[..., window:] - gaps[..., :-window]
+    return np.where(holes > 0, np.nan, totals / window)
+
+
+def best_windows(values, window=2, k=1):
+    """Top-k non-overlapping windows per day.
+
+    `values` is (..., days, 24). Returns (starts, scores), each shaped
+    (..., days, k): the starting hour of each window (-1 where fewer than k
+    windows exist) and its mean comfort (NaN likewise), best first.
+    """
+    if not 1 <= window <= 24:
+        raise ValueError("window must be between 1 and 24 hours")
+    means = window_means(values, window)
+    remaining = np.where(np.isnan(means), -np.inf, means)
+    positions = np.arange(remaining.shape[-1])
+
+    starts = np.full(remaining.shape[:-1] + (k,), -1, dtype=int)
+    scores = np.full(remaining.shape[:-1] + (k,), np.nan)
+    for rank in range(k):
+        best = np.argmax(remaining, axis=-1)
+        score = np.take_along_axis(remaining, best[..., np.newaxis], axis=-1)[..., 0]
+        found = np.isfinite(score)
+        starts[..., rank] = np.where(found, best, -1)
+        scores[..., rank] = np.where(found, score, np.nan)
+        # Block every window that would overlap the one just chosen.
+        overlap = np.abs(positions - best[..., np.newaxis]) < window
+        remaining = np.where(overlap & found[..., np.newaxis], -np.inf, remaining)
+    return starts, scores